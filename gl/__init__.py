@@ -87,9 +87,15 @@ def main():
     signal.signal(signal.SIGINT, __signal_handler)
 
     # Init the worker
-    worker = Worker(config=core.get_config(),
-                    args=core.get_args())
-
-    # Start the standalone (CLI) loop
+    if core.get_args().server:
+        # Python 3 only (asyncio)
+        from gl.server import Server
+        worker = Server(config=core.get_config(),
+                        args=core.get_args())
+    else:
+        worker = Worker(config=core.get_config(),
+                        args=core.get_args())
+
+    # Start the standalone (CLI) loop or the server
     worker.run()
 
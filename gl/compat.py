@@ -23,6 +23,8 @@ if PY3:
     from configparser import ConfigParser, NoOptionError, NoSectionError
     from xmlrpc.client import Fault, ProtocolError, ServerProxy, Transport
     from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
     from urllib.request import urlopen
     from urllib.error import URLError
 
@@ -73,6 +75,8 @@ else:
     from itertools import imap as map
     from ConfigParser import SafeConfigParser as ConfigParser, NoOptionError, NoSectionError
     from SimpleXMLRPCServer import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
     from xmlrpclib import Fault, ProtocolError, ServerProxy, Transport
     from urllib2 import urlopen, URLError
 
@@ -3,6 +3,8 @@
 
 """CPU percent stats shared between CPU and Quicklook plugins."""
 
+import threading
+
 from gl.timer import Timer
 
 import psutil
@@ -22,6 +24,9 @@ class CpuPercent(object):
         self.timer_percpu = Timer(0)
         self.cached_time = cached_time
 
+        # Plugins can be updated in parallel (see the PluginScheduler class)
+        self._lock = threading.Lock()
+
     def get_key(self):
         """Return the key of the per CPU list."""
         return 'cpu_number'
@@ -29,10 +34,11 @@ class CpuPercent(object):
     def get(self, percpu=False):
         """Update and/or return the CPU using the psutil library.
         If percpu, return the percpu stats"""
-        if percpu:
-            return self.__get_percpu()
-        else:
-            return self.__get_cpu()
+        with self._lock:
+            if percpu:
+                return self.__get_percpu()
+            else:
+                return self.__get_cpu()
 
     def __get_cpu(self):
         """Update and/or return the CPU using the psutil library."""
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+
+"""Flatten the plugins stats into export columns (names and values)."""
+
+import threading
+
+from gl.compat import iteritems
+
+# Compiled columns names (key: (plugin, shape), value: names list)
+# Shared by all the export modules
+_schemas = {}
+_schemas_lock = threading.Lock()
+# Maximum number of compiled schemas (the cache is cleared when reached)
+_schemas_max = 1024
+
+
+def flatten(stats, values):
+    """Append the values of stats to the values list and return its shape.
+
+    The shape describes the stats structure (keys, nested dicts and lists):
+    stats with the same shape have the same columns names.
+    """
+    if isinstance(stats, dict):
+        # Is there a key ?
+        if 'key' in stats:
+            pre_key = stats[stats['key']]
+            if isinstance(pre_key, list):
+                pre_key = tuple(pre_key)
+            has_key = True
+        else:
+            pre_key = None
+            has_key = False
+        items = []
+        for key, value in iteritems(stats):
+            if isinstance(value, list):
+                try:
+                    value = value[0]
+                except IndexError:
+                    value = ''
+            if isinstance(value, dict):
+                items.append((key, flatten(value, values)))
+            else:
+                items.append(key)
+                values.append(value)
+        return ('d', has_key, pre_key, tuple(items))
+    elif isinstance(stats, list):
+        return ('l', tuple(flatten(item, values) for item in stats))
+    return None
+
+
+def compile_names(shape):
+    """Return the columns names of a stats shape."""
+    names = []
+    if shape is None:
+        return names
+    if shape[0] == 'd':
+        _, has_key, pre_key, items = shape
+        pre_key = '{}.'.format(list(pre_key) if isinstance(pre_key, tuple) else pre_key) if has_key else ''
+        for item in items:
+            if isinstance(item, tuple):
+                key, sub_shape = item
+                names += [pre_key + key.lower() + str(i) for i in compile_names(sub_shape)]
+            else:
+                names.append(pre_key + item.lower())
+    else:
+        for sub_shape in shape[1]:
+            names += compile_names(sub_shape)
+    return names
+
+
+def build_export(plugin, stats, limits=None):
+    """Return the (names, values) lists to export for the stats of a plugin.
+
+    The limits (dict) are added to the dict stats (stats are not updated).
+    Columns names are compiled once per stats shape.
+    """
+    if isinstance(stats, dict) and limits:
+        stats = dict(stats)
+        stats.update(limits)
+    values = []
+    shape = (plugin, flatten(stats, values))
+    try:
+        names = _schemas[shape]
+    except KeyError:
+        names = compile_names(shape[1])
+        with _schemas_lock:
+            if len(_schemas) >= _schemas_max:
+                _schemas.clear()
+            _schemas[shape] = names
+    return list(names), values
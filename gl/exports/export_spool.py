@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+
+"""Disk spool for the stats not exported during a server outage."""
+
+import json
+import os
+import re
+
+from gl.logger import logger
+
+
+class ExportSpool(object):
+
+    """Append-only spool of an export module.
+
+    Records (timestamp, name, columns, points) are appended, one JSON
+    object per line, to segment files <path>/<export>.<number>.spool. A new
+    segment is started when the current one reaches segment_size bytes and
+    the oldest segments are deleted when the spool reaches max_size bytes.
+
+    Records are read back in order (read method) and removed from the spool
+    once they are exported (commit method). The read position is saved in
+    the <path>/<export>.pos file, so the spool survives restarts.
+    """
+
+    def __init__(self, path, export_name, max_size=100 * 1024 * 1024, segment_size=None):
+        self.path = path
+        self.export_name = export_name
+        self.max_size = int(max_size)
+        self.segment_size = int(segment_size or max(1024, self.max_size // 10))
+        self._pos_file = os.path.join(path, '{}.pos'.format(export_name))
+        self._re_segment = re.compile(r'^{}\.(\d+)\.spool$'.format(re.escape(export_name)))
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # Segments numbers
+        self._segments = sorted(int(m.group(1)) for m in map(self._re_segment.match, os.listdir(path)) if m)
+        # Read position (segment number, offset)
+        self._read = self.__load_pos()
+        # Position after the last read (see commit)
+        self._next = None
+        # Current segment (opened in append mode)
+        self._file = None
+        # Dropped records (spool full)
+        self.dropped = 0
+
+    def __segment_path(self, number):
+        return os.path.join(self.path, '{}.{:08d}.spool'.format(self.export_name, number))
+
+    def __load_pos(self):
+        """Load the read position."""
+        try:
+            with open(self._pos_file) as f:
+                number, offset = [int(i) for i in f.read().split()]
+        except (IOError, OSError, ValueError):
+            number, offset = None, 0
+        if not self._segments:
+            return None, 0
+        if number not in self._segments:
+            return self._segments[0], 0
+        return number, offset
+
+    def __save_pos(self):
+        """Save the read position."""
+        tmp_file = self._pos_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            f.write('{} {}'.format(*self._read))
+        os.rename(tmp_file, self._pos_file)
+
+    def size(self):
+        """Return the size of the spool (in bytes)."""
+        size = 0
+        for number in self._segments:
+            try:
+                size += os.path.getsize(self.__segment_path(number))
+            except OSError:
+                pass
+        return size
+
+    def empty(self):
+        """Return True if there is no record to read."""
+        if not self._segments:
+            return True
+        number, offset = self._read
+        return number == self._segments[-1] and \
+            offset >= os.path.getsize(self.__segment_path(number))
+
+    def append(self, timestamp, name, columns, points):
+        """Append a record to the spool."""
+        if self._file is None or self._file.tell() >= self.segment_size:
+            self.__new_segment()
+        line = json.dumps({'t': timestamp, 'n': name, 'c': columns, 'p': points},
+                          default=str) + '\n'
+        self._file.write(line.encode('utf-8'))
+        self._file.flush()
+
+    def __new_segment(self):
+        """Start a new segment (delete the oldest ones if the spool is full)."""
+        if self._file is not None:
+            self._file.close()
+        number = self._segments[-1] + 1 if self._segments else 0
+        self._segments.append(number)
+        if self._read[0] is None:
+            self._read = (number, 0)
+        self._file = open(self.__segment_path(number), 'ab')
+        while len(self._segments) > 1 and self.size() > self.max_size:
+            self.__drop_segment()
+
+    def __drop_segment(self):
+        """Delete the oldest segment."""
+        number = self._segments.pop(0)
+        path = self.__segment_path(number)
+        with open(path, 'rb') as f:
+            if number == self._read[0]:
+                f.seek(self._read[1])
+            dropped = sum(1 for _ in f)
+        os.remove(path)
+        if dropped:
+            logger.warning("Export spool {} is full, {} records dropped".format(self.export_name, dropped))
+            self.dropped += dropped
+        if number == self._read[0]:
+            self._read = (self._segments[0], 0)
+            self.__save_pos()
+
+    def read(self, nb):
+        """Return the next nb records (list of (timestamp, name, columns, points))."""
+        records = []
+        number, offset = self._read
+        while number is not None and len(records) < nb:
+            with open(self.__segment_path(number), 'rb') as f:
+                f.seek(offset)
+                for line in iter(f.readline, b''):
+                    if not line.endswith(b'\n'):
+                        # Incomplete record (being written)
+                        break
+                    offset += len(line)
+                    try:
+                        r = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        logger.warning("Export spool {}: skip a corrupted record".format(self.export_name))
+                        continue
+                    records.append((r['t'], r['n'], r['c'], r['p']))
+                    if len(records) >= nb:
+                        break
+            if len(records) >= nb or number == self._segments[-1]:
+                break
+            # Next segment
+            number, offset = self._segments[self._segments.index(number) + 1], 0
+        self._next = (number, offset)
+        return records
+
+    def commit(self):
+        """Remove the records returned by the last read from the spool."""
+        if self._next is None:
+            return
+        number = self._next[0]
+        if number not in self._segments:
+            # Segment dropped since the read (spool full)
+            self._next = None
+            return
+        # Delete the fully read segments (except the current one)
+        while self._segments[0] != number:
+            os.remove(self.__segment_path(self._segments.pop(0)))
+        self._read, self._next = self._next, None
+        self.__save_pos()
+
+    def close(self):
+        """Close the current segment."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+
+"""Run the export modules in dedicated long-lived threads."""
+
+import collections
+import threading
+from time import time
+
+from gl.logger import logger
+
+
+class ExportWorker(object):
+
+    """This class runs an export module in a dedicated thread.
+
+    Snapshots are given to the thread through a bounded queue. If the
+    export module is slower than the refresh cycle, the queue policy is
+    applied when the queue is full:
+    - drop: drop the oldest snapshot in the queue
+    - coalesce: replace all the snapshots in the queue by the new one
+    """
+
+    policies = ('drop', 'coalesce')
+
+    def __init__(self, export, queue_size=2, policy='drop'):
+        """Init and start the worker thread.
+
+        export: export module instance
+        queue_size: maximum number of snapshots waiting in the queue
+        policy: drop or coalesce
+        """
+        self.export = export
+        self.queue_size = max(1, int(queue_size))
+        if policy not in self.policies:
+            logger.warning("Unknown export queue policy {}, use drop".format(policy))
+            policy = 'drop'
+        self.policy = policy
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        # Metrics
+        self.max_depth = 0
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_duration = None
+
+        self._thread = threading.Thread(target=self.__run,
+                                        name='gl-export-{}'.format(export.export_name))
+        # Do not prevent Glances to exit if an export server is hung
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, snapshot):
+        """Add a snapshot in the queue (never block)."""
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                if self.policy == 'coalesce':
+                    dropped = len(self._queue)
+                    self._queue.clear()
+                else:
+                    dropped = 1
+                    self._queue.popleft()
+                if self.dropped == 0:
+                    logger.warning("Export module {} is too slow, stats are dropped".format(self.export.export_name))
+                self.dropped += dropped
+            self._queue.append(snapshot)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+
+    def __run(self):
+        """Worker loop: export the snapshots of the queue."""
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if not self._queue:
+                    # Stopped and all the snapshots are exported
+                    break
+                snapshot = self._queue.popleft()
+            start = time()
+            try:
+                self.export.update(snapshot)
+            except Exception as e:
+                self.errors += 1
+                logger.error("Cannot export stats using the {} module ({})".format(self.export.export_name, e))
+            else:
+                self.exported += 1
+            self.last_duration = time() - start
+
+    @property
+    def depth(self):
+        """Number of snapshots waiting in the queue."""
+        return len(self._queue)
+
+    def get_metrics(self):
+        """Return the worker metrics (dict)."""
+        return {'queue_depth': self.depth,
+                'queue_size': self.queue_size,
+                'queue_max_depth': self.max_depth,
+                'exported': self.exported,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'last_duration': self.last_duration}
+
+    def stop(self, timeout=None):
+        """Stop the worker thread (after the export of the queue).
+
+        Return False if the thread is still running after timeout seconds.
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Export module {} did not stop in {} seconds".format(self.export.export_name, timeout))
+            return False
+        return True
@@ -4,13 +4,16 @@
 """Cassandra/Scylla interface class."""
 
 import sys
+import threading
 from numbers import Number
+from time import time
 
 from gl.compat import NoOptionError, NoSectionError
 from gl.logger import logger
 from gl.exports.glances_export import GlancesExport
 
 from cassandra.cluster import Cluster
+from cassandra.query import BatchStatement, BatchType
 from cassandra.util import uuid_from_time
 from cassandra import InvalidRequest
 from datetime import datetime
@@ -31,13 +34,30 @@ class Export(GlancesExport):
         self.keyspace = None
         self.replication_factor = 2
         self.table = None
+        # Time to live of the rows in seconds (0 for no expiration)
+        self.ttl = 0
+        # Insert the rows of a refresh in a single unlogged batch
+        self.batch_enable = False
+        # Maximum number of asynchronous requests in flight
+        self.max_in_flight = 16
         self.export_enable = self.load_conf()
         if not self.export_enable:
             sys.exit(2)
 
+        # Requests in flight and stats of the failed requests
+        self.in_flight = 0
+        self.failed_records = []
+        self.cond = threading.Condition()
+        # The spooled stats are replayed synchronously (see replay)
+        self.replaying = False
+
         # Init the Cassandra client
         self.cluster, self.session = self.init()
 
+        # The insert statement is prepared once
+        self.insert = self.session.prepare(
+            "INSERT INTO {} (plugin, time, stat) VALUES (?, ?, ?) USING TTL ?".format(self.table))
+
     def load_conf(self, section="cassandra"):
         """Load the Cassandra configuration in the Glances configuration file."""
         if self.config is None:
@@ -68,6 +88,14 @@ class Export(GlancesExport):
             self.table = self.config.get_value(section, 'table')
         except NoOptionError:
             self.table = self.host
+        try:
+            self.ttl = int(self.config.get_value(section, 'ttl', default=self.ttl))
+            self.max_in_flight = max(1, int(self.config.get_value(section, 'max_in_flight',
+                                                                  default=self.max_in_flight)))
+        except ValueError as e:
+            logger.critical("Error in the Cassandra configuration (%s)" % e)
+            return False
+        self.batch_enable = self.config.get_value(section, 'batch', default='false').lower() == 'true'
 
         return True
 
@@ -108,29 +136,111 @@ class Export(GlancesExport):
 
         return cluster, session
 
+    def update(self, stats):
+        """Export the stats (the stats of the failed requests are spooled first)."""
+        # Spool the stats of the failed requests
+        with self.cond:
+            records, self.failed_records = self.failed_records, []
+        for name, columns, points, timestamp in records:
+            self.spool_append(name, columns, points, timestamp=timestamp)
+
+        return super(Export, self).update(stats)
+
+    def send(self, statements, records):
+        """Execute the insert statements of the refresh (asynchronously).
+
+        In batch mode, the rows are inserted in a single unlogged batch.
+        """
+        if self.batch_enable:
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            for statement in statements:
+                batch.add(statement)
+            self.execute(batch, records)
+            return
+        for i, statement in enumerate(statements):
+            try:
+                self.execute(statement, records[i:i + 1])
+            except Exception as e:
+                if i == 0 or self.replaying:
+                    raise
+                # Spool the stats not sent at the next refresh
+                logger.error("Cannot export stats to Cassandra ({})".format(e))
+                with self.cond:
+                    self.failed_records += records[i:]
+                return
+
+    def replay(self):
+        """Export the spooled stats.
+
+        The requests are executed synchronously: the spool is only
+        committed once they succeeded (the stats of a failed request
+        stay in the spool, in order).
+        """
+        self.replaying = True
+        try:
+            return super(Export, self).replay()
+        finally:
+            self.replaying = False
+
+    def execute(self, statement, records):
+        """Execute the statement asynchronously (synchronously in replay).
+
+        Wait (at most until the request timeout) if max_in_flight requests
+        are already in flight. The stats (records) of a failed request are
+        spooled at the next refresh.
+        """
+        if self.replaying:
+            # Raise if the request failed
+            self.session.execute(statement)
+            return
+        with self.cond:
+            deadline = time() + self.session.default_timeout
+            while self.in_flight >= self.max_in_flight:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    raise IOError("Too many Cassandra requests in flight")
+                self.cond.wait(remaining)
+            self.in_flight += 1
+        try:
+            future = self.session.execute_async(statement)
+        except Exception:
+            self.__done()
+            raise
+        future.add_callbacks(self.__done, self.__failed, errback_args=(records,))
+
+    def __done(self, *args):
+        """Callback of the asynchronous requests."""
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+    def __failed(self, e, records):
+        """Error callback of the asynchronous requests."""
+        logger.error("Cannot export stats to Cassandra ({})".format(e))
+        with self.cond:
+            self.failed_records += records
+        self.__done()
+
     def export(self, name, columns, points):
         """Write the points to the Cassandra cluster."""
         logger.debug("Export {} stats to Cassandra".format(name))
 
         # Remove non number stats and convert all to float (for Boolean)
-        data = {k: float(v) for (k, v) in dict(zip(columns, points)).iteritems() if isinstance(v, Number)}
+        data = dict((k, float(v)) for k, v in zip(columns, points) if isinstance(v, Number))
 
         # Write input to the Cassandra table
-        try:
-            self.session.execute(
-                """
-                INSERT INTO localhost (plugin, time, stat)
-                VALUES (%s, %s, %s)
-                """,
-                (name, uuid_from_time(datetime.now()), data)
-            )
-        except Exception as e:
-            logger.error("Cannot export {} stats to Cassandra ({})".format(name, e))
+        statement = self.insert.bind((name, uuid_from_time(self.timestamp or datetime.now()), data, self.ttl))
+        self.batch_append(name, columns, points, [statement])
 
     def exit(self):
         """Close the Cassandra export module."""
+        # Call the father method (send the last rows)
+        super(Export, self).exit()
+        # Wait for the requests in flight
+        with self.cond:
+            deadline = time() + self.session.default_timeout
+            while self.in_flight and time() < deadline:
+                self.cond.wait(deadline - time())
         # To ensure all connections are properly closed
         self.session.shutdown()
         self.cluster.shutdown()
-        # Call the father method
-        super(Export, self).exit()
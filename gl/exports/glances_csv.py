@@ -4,17 +4,51 @@
 """CSV interface class."""
 
 import csv
+import gzip
+import os
+import shutil
 import sys
 import time
 
-from gl.compat import PY3, iterkeys, itervalues
+from gl.compat import PY3, iteritems
 from gl.logger import logger
 from gl.exports.glances_export import GlancesExport
 
 
+class CountingFile(object):
+
+    """Write to a file and count the written bytes.
+
+    The file size is not read with tell(), which flushes a text file.
+    """
+
+    def __init__(self, f, size=0):
+        self.f = f
+        self.size = size
+        self.encoding = getattr(f, 'encoding', None) if PY3 else None
+
+    def write(self, data):
+        self.f.write(data)
+        self.size += len(data.encode(self.encoding) if self.encoding else data)
+
+
 class Export(GlancesExport):
 
-    """This class manages the CSV export module."""
+    """This class manages the CSV export module.
+
+    Two formats are available:
+    - wide (default): one line per refresh, one column per stat. A new
+      file is started when new columns (a new interface, a new
+      container...) appear, so the lines always match the header.
+    - long: one line (timestamp, plugin, key, field, value) per stat.
+
+    Lines are flushed every flush_rows lines or flush_time seconds. The
+    file is rotated (renamed <name>.<date>.csv, optionally gzipped) every
+    rotate_time seconds or when it reaches rotate_size MB.
+    """
+
+    formats = ('wide', 'long')
+    changed_only_support = False
 
     def __init__(self, config=None, args=None):
         """Init the CSV export IF."""
@@ -23,13 +57,25 @@ class Export(GlancesExport):
         # CSV file name
         self.csv_filename = args.export_csv
 
+        # Load the CSV configuration
+        self.format = 'wide'
+        self.flush_rows = 1
+        self.flush_time = 0
+        self.rotate_size = 0
+        self.rotate_time = 0
+        self.compress = False
+        self.load_conf()
+
+        # Columns of the current file (wide format)
+        self.header = None
+        # Lines written since the last flush
+        self.unflushed = 0
+        self.last_flush = time.time()
+
         # Set the CSV output file
+        self.csv_file = None
         try:
-            if PY3:
-                self.csv_file = open(self.csv_filename, 'w', newline='')
-            else:
-                self.csv_file = open(self.csv_filename, 'wb')
-            self.writer = csv.writer(self.csv_file)
+            self.open()
         except IOError as e:
             logger.critical("Cannot create the CSV file: {}".format(e))
             sys.exit(2)
@@ -38,46 +84,155 @@ class Export(GlancesExport):
 
         self.export_enable = True
 
-        self.first_line = True
+    def load_conf(self, section='csv'):
+        """Load the CSV configuration in the Glances configuration file."""
+        if self.config is None or not self.config.has_section(section):
+            return
+        self.format = self.config.get_value(section, 'format', default=self.format)
+        if self.format not in self.formats:
+            logger.warning("Unknown CSV format {}, use wide".format(self.format))
+            self.format = 'wide'
+        self.flush_rows = max(1, int(self.config.get_float_value(section, 'flush_rows', default=self.flush_rows)))
+        self.flush_time = self.config.get_float_value(section, 'flush_time', default=self.flush_time)
+        self.rotate_size = self.config.get_float_value(section, 'rotate_size', default=self.rotate_size)
+        self.rotate_time = self.config.get_float_value(section, 'rotate_time', default=self.rotate_time)
+        self.compress = self.config.get_value(section, 'compress', default='false').lower() == 'true'
+        logger.debug("Load CSV from the Glances configuration file")
+
+    def open(self, append=False):
+        """Open the CSV file.
+
+        An existing long format file is appended. If append is True (the
+        rotation failed), the file is appended and the header kept.
+        """
+        size = os.path.getsize(self.csv_filename) if os.path.isfile(self.csv_filename) else 0
+        if not append:
+            append = self.format == 'long' and size > 0
+            self.header = None
+        if not append:
+            size = 0
+        mode = 'a' if append else 'w'
+        if PY3:
+            self.csv_file = open(self.csv_filename, mode, newline='')
+        else:
+            self.csv_file = open(self.csv_filename, mode + 'b')
+        # Written bytes are counted for the rotation by size
+        self.counter = CountingFile(self.csv_file, size)
+        self.writer = csv.writer(self.counter)
+        self.csv_start = time.time()
+        if self.format == 'long' and not append:
+            self.writer.writerow(['timestamp', 'plugin', 'key', 'field', 'value'])
+
+    def close(self):
+        """Flush and close the CSV file."""
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.unflushed = 0
+
+    def rotate(self):
+        """Rename (and compress) the CSV file and open a new one.
+
+        Return False if the file can not be renamed (the file is kept,
+        with its header).
+        """
+        self.close()
+        root, ext = os.path.splitext(self.csv_filename)
+        name = '{}.{}'.format(root, time.strftime('%Y%m%d-%H%M%S', time.localtime(self.csv_start)))
+        filename = name + ext
+        n = 1
+        while os.path.exists(filename) or os.path.exists(filename + '.gz'):
+            filename = '{}-{}{}'.format(name, n, ext)
+            n += 1
+        try:
+            os.rename(self.csv_filename, filename)
+        except (IOError, OSError) as e:
+            # Do not truncate the file: keep appending to it (the rotation
+            # is tried again after rotate_time seconds or rotate_size MB)
+            logger.error("Cannot rotate the CSV file ({})".format(e))
+            self.open(append=True)
+            self.counter.size = 0
+            return False
+        if self.compress:
+            try:
+                with open(filename, 'rb') as f_in:
+                    with gzip.open(filename + '.gz', 'wb') as f_out:
+                        shutil.copyfileobj(f_in, f_out)
+                os.remove(filename)
+            except (IOError, OSError) as e:
+                logger.error("Cannot compress the CSV file {} ({})".format(filename, e))
+        self.open()
+        return True
+
+    def need_rotate(self):
+        """Return True if the CSV file should be rotated."""
+        if self.rotate_time and time.time() - self.csv_start >= self.rotate_time:
+            return True
+        if self.rotate_size and self.counter.size >= self.rotate_size * 1024 * 1024:
+            return True
+        return False
 
     def exit(self):
         """Close the CSV file."""
         logger.debug("Finalise export interface %s" % self.export_name)
-        self.csv_file.close()
+        self.close()
+        super(Export, self).exit()
+
+    def flush(self):
+        """Write the buffered lines in the CSV file."""
+        if self.csv_file is not None:
+            self.csv_file.flush()
+        self.unflushed = 0
+        self.last_flush = time.time()
+
+    def get_lines(self, stats):
+        """Return the (plugin, key, field, value) list of the stats to export."""
+        lines = []
+        all_stats = stats.getAllExports()
+        for i, plugin in enumerate(stats.getAllPlugins()):
+            if plugin not in self.plugins_to_export():
+                continue
+            if isinstance(all_stats[i], list):
+                for stat in all_stats[i]:
+                    key = self.get_item_key(stat)
+                    lines += [(plugin, key, field, value) for field, value in iteritems(stat)]
+            elif isinstance(all_stats[i], dict):
+                lines += [(plugin, None, field, value) for field, value in iteritems(all_stats[i])]
+        return lines
 
     def update(self, stats):
         """Update stats in the CSV output file."""
-        # Get the stats
-        all_stats = stats.getAllExports()
-        plugins = stats.getAllPlugins()
-
-        # Init data with timestamp (issue#708)
-        csv_header = ['timestamp']
-        csv_data = [time.strftime('%Y-%m-%d %H:%M:%S')]
-
-        # Loop over available plugin
-        for i, plugin in enumerate(plugins):
-            if plugin in self.plugins_to_export():
-                if isinstance(all_stats[i], list):
-                    for stat in all_stats[i]:
-                        # First line: header
-                        if self.first_line:
-                            csv_header += ('{}_{}_{}'.format(
-                                plugin, self.get_item_key(stat), item) for item in stat)
-                        # Others lines: stats
-                        csv_data += itervalues(stat)
-                elif isinstance(all_stats[i], dict):
-                    # First line: header
-                    if self.first_line:
-                        fieldnames = iterkeys(all_stats[i])
-                        csv_header += ('{}_{}'.format(plugin, fieldname)
-                                       for fieldname in fieldnames)
-                    # Others lines: stats
-                    csv_data += itervalues(all_stats[i])
-
-        # Export to CSV
-        if self.first_line:
-            self.writer.writerow(csv_header)
-            self.first_line = False
-        self.writer.writerow(csv_data)
-        self.csv_file.flush()
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S',
+                                  time.localtime(getattr(stats, 'timestamp', None) or time.time()))
+        lines = self.get_lines(stats)
+
+        if self.need_rotate():
+            self.rotate()
+
+        if self.format == 'long':
+            self.writer.writerows([timestamp, plugin, '' if key is None else key, field, value]
+                                  for plugin, key, field, value in lines)
+        else:
+            columns = ['{}_{}'.format(plugin, field) if key is None else
+                       '{}_{}_{}'.format(plugin, key, field)
+                       for plugin, key, field, _ in lines]
+            row = dict(zip(columns, (value for _, _, _, value in lines)))
+            if self.header is not None and not set(columns) <= set(self.header):
+                # New columns: start a new file (with a new header)
+                if self.rotate():
+                    self.header = None
+                else:
+                    # Keep the header: the new columns are not exported
+                    # until the file can be rotated
+                    logger.warning("New columns not exported to the CSV file: {}".format(
+                        ', '.join(sorted(set(columns) - set(self.header)))))
+            if self.header is None:
+                self.header = columns
+                self.writer.writerow(['timestamp'] + self.header)
+            # Data starts with the timestamp (issue#708)
+            self.writer.writerow([timestamp] + [row.get(c, '') for c in self.header])
+
+        self.unflushed += 1
+        if self.unflushed >= self.flush_rows or \
+                (self.flush_time and time.time() - self.last_flush >= self.flush_time):
+            self.flush()
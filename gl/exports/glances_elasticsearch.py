@@ -3,6 +3,7 @@
 
 """ElasticSearch interface class."""
 
+import json
 import sys
 from datetime import datetime
 
@@ -10,7 +11,7 @@ from gl.compat import NoOptionError, NoSectionError
 from gl.logger import logger
 from gl.exports.glances_export import GlancesExport
 
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import Elasticsearch
 
 
 class Export(GlancesExport):
@@ -25,6 +26,8 @@ class Export(GlancesExport):
         self.host = None
         self.port = None
         self.index = None
+        # Time based index name: <index>-<date> (date format, ex: %Y.%m.%d)
+        self.index_date = None
         self.export_enable = self.load_conf()
         if not self.export_enable:
             sys.exit(2)
@@ -49,6 +52,18 @@ class Export(GlancesExport):
         else:
             logger.debug("Load ElasticSearch from the Glances configuration file")
 
+        # Optional settings
+        self.index_date = self.config.get_value(section, 'index_date')
+        # Write the documents every batch_size refresh or batch_timeout seconds
+        try:
+            self.batch_size = max(1, int(self.config.get_value(section, 'batch_size', default=1)))
+            batch_timeout = self.config.get_value(section, 'batch_timeout')
+            if batch_timeout is not None:
+                self.batch_timeout = float(batch_timeout)
+        except ValueError as e:
+            logger.critical("Error in the ElasticSearch configuration (%s)" % e)
+            return False
+
         return True
 
     def init(self):
@@ -64,6 +79,10 @@ class Export(GlancesExport):
         else:
             logger.info("Connected to the ElasticSearch server %s:%s" % (self.host, self.port))
 
+        if self.index_date is not None:
+            # Time based indexes are created at the first write
+            return es
+
         try:
             index_count = es.count(index=self.index)['count']
         except Exception as e:
@@ -75,27 +94,38 @@ class Export(GlancesExport):
 
         return es
 
+    def send(self, data, records):
+        """Write the documents of the batch in a single bulk request.
+
+        The request is not retried: if it fails, the stats are spooled
+        (see write_batch) and replayed at the spool rate.
+        """
+        logger.debug("Export {} documents to ElasticSearch".format(len(data) // 2))
+        body = '\n'.join(data) + '\n'
+        ret = self.client.bulk(body=body)
+        if ret.get('errors'):
+            # Documents rejected by the server are not retried
+            errors = [i for i in ret['items'] if 'error' in list(i.values())[0]]
+            logger.warning("{} documents rejected by ElasticSearch ({})".format(
+                len(errors), list(errors[0].values())[0]['error'] if errors else ''))
+
+    def get_index(self):
+        """Return the index of the stats timestamp."""
+        if self.index_date is None:
+            return self.index
+        date = datetime.fromtimestamp(self.timestamp) if self.timestamp else datetime.now()
+        return '{}-{}'.format(self.index, date.strftime(self.index_date))
+
     def export(self, name, columns, points):
-        """Write the points to the ES server."""
+        """Add the documents to the batch."""
         logger.debug("Export {} stats to ElasticSearch".format(name))
 
-        # Create DB input
-        # https://elasticsearch-py.readthedocs.io/en/master/helpers.html
-        actions = []
+        # Create the bulk request lines (action and document)
+        # https://www.elastic.co/guide/en/elasticsearch/reference/current/docs-bulk.html
+        index = self.get_index()
+        timestamp = (datetime.fromtimestamp(self.timestamp) if self.timestamp else datetime.now()).isoformat()
+        lines = []
         for c, p in zip(columns, points):
-            action = {
-                "_index": self.index,
-                "_type": name,
-                "_id": c,
-                "_source": {
-                    "value": str(p),
-                    "timestamp": datetime.now()
-                }
-            }
-            actions.append(action)
-
-        # Write input to the ES index
-        try:
-            helpers.bulk(self.client, actions)
-        except Exception as e:
-            logger.error("Cannot export {} stats to ElasticSearch ({})".format(name, e))
+            lines.append(json.dumps({'index': {'_index': index, '_type': name, '_id': c}}))
+            lines.append(json.dumps({'value': str(p), 'timestamp': timestamp}))
+        self.batch_append(name, columns, points, lines)
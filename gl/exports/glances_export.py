@@ -7,7 +7,11 @@ I am your father...
 ...for all Glances exports IF.
 """
 
-from gl.compat import iteritems, iterkeys
+import os
+from time import time
+
+from gl.exports.export_schema import build_export
+from gl.exports.export_spool import ExportSpool
 from gl.logger import logger
 
 
@@ -15,6 +19,10 @@ class GlancesExport(object):
 
     """Main class for Glances export IF."""
 
+    # The changed-only mode is only supported by the push exports (the
+    # file and pull exports need all the values of each refresh)
+    changed_only_support = True
+
     def __init__(self, config=None, args=None):
         """Init the export class."""
         # Export name (= module name without glances_)
@@ -29,9 +37,210 @@ class GlancesExport(object):
         # Had to be set to True in the __init__ class of child
         self.export_enable = False
 
+        # Timestamp of the exported stats
+        self.timestamp = None
+
+        # Spool for the stats not exported (server outage)
+        self.spool = None
+        self.spool_rate = 100
+        self.spool_last_replay = time()
+        self.load_spool()
+
+        # Changed-only mode: only export the values changed since the last
+        # export (and all the values every full_refresh exports)
+        self.changed_only = False
+        self.full_refresh = 60
+        # Number of exports, last exported values and values of the batch
+        # (key: plugin, value: dict)
+        self.cycles = 0
+        self.last_values = {}
+        self.batch_values = {}
+        self.load_changed_only()
+
+        # Exported names (key: (plugin, columns), value: names list)
+        self.names = {}
+
+        # Data waiting to be sent (and the matching exported stats)
+        # Sent every batch_size refresh or batch_timeout seconds
+        self.batch = []
+        self.batch_records = []
+        self.batch_size = 1
+        self.batch_timeout = None
+        self.batch_cycles = 0
+        self.batch_start = time()
+
+    def load_spool(self, section='global'):
+        """Init the spool if export_spool_path is set in the configuration file."""
+        if self.config is None or not self.config.has_section(section):
+            return
+        path = self.config.get_value(section, 'export_spool_path')
+        if path is None:
+            return
+        max_size = self.config.get_float_value(section, 'export_spool_size', default=100) * 1024 * 1024
+        self.spool_rate = self.config.get_float_value(section, 'export_spool_rate', default=self.spool_rate)
+        try:
+            self.spool = ExportSpool(os.path.expanduser(path), self.export_name, max_size=max_size)
+        except (IOError, OSError) as e:
+            logger.error("Cannot init the {} export spool ({})".format(self.export_name, e))
+        else:
+            logger.debug("Stats not exported by {} are spooled in {}".format(self.export_name, path))
+
+    def load_changed_only(self):
+        """Load the changed-only mode settings from the export module section."""
+        section = self.export_name
+        if self.config is None or not self.config.has_section(section):
+            return
+        changed_only = self.config.get_value(section, 'changed_only', default='false')
+        self.changed_only = changed_only.lower() == 'true'
+        if self.changed_only and not self.changed_only_support:
+            logger.warning("The changed-only mode is not supported by the {} export (ignored)".format(
+                self.export_name))
+            self.changed_only = False
+        self.full_refresh = max(1, int(self.config.get_float_value(section, 'full_refresh',
+                                                                   default=self.full_refresh)))
+        if self.changed_only:
+            logger.debug("Only export the changed stats using {} (full export every {} refresh)".format(
+                self.export_name, self.full_refresh))
+
+    def filter_changed(self, plugin, names, values, full=False):
+        """Return the (names, values) changed since the last export of the plugin.
+
+        The last exported values are updated when the batch is sent (see
+        write_batch). Return all the names and values if full is True.
+        """
+        current = dict(zip(names, values))
+        last = self.last_values.get(plugin)
+        self.batch_values[plugin] = current
+        if full or last is None:
+            return names, values
+        changed = [(n, v) for n, v in zip(names, values) if n not in last or last[n] != v]
+        return [n for n, _ in changed], [v for _, v in changed]
+
     def exit(self):
-        """Close the export module."""
+        """Close the export module (send the last batch)."""
         logger.debug("Finalise export interface %s" % self.export_name)
+        self.write_batch()
+        if self.spool is not None:
+            self.spool.close()
+
+    def build_name(self, name, column):
+        """Return the exported name of a column of the plugin."""
+        return '{}.{}'.format(name, column)
+
+    def get_names(self, name, columns):
+        """Return the exported names of the columns (built once per columns list)."""
+        key = (name, tuple(columns))
+        try:
+            return self.names[key]
+        except KeyError:
+            if len(self.names) >= 1024:
+                self.names.clear()
+            names = self.names[key] = [self.build_name(name, c) for c in columns]
+            return names
+
+    def batch_append(self, name, columns, points, data):
+        """Add the data (list) built by the export method to the batch."""
+        self.batch_records.append((name, columns, list(points), self.timestamp))
+        self.batch += data
+
+    def batch_needed(self):
+        """Return True if the batch should be sent (batch_size or batch_timeout)."""
+        return self.batch_cycles >= self.batch_size or \
+            (self.batch_timeout is not None and time() - self.batch_start >= self.batch_timeout)
+
+    def write_batch(self):
+        """Send the batch (spool the stats if the send failed)."""
+        self.batch_cycles = 0
+        self.batch_start = time()
+        values, self.batch_values = self.batch_values, {}
+        records = self.batch_records
+        if not records:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Cannot export stats using the {} module ({})".format(self.export_name, e))
+            for name, columns, points, timestamp in records:
+                self.spool_append(name, columns, points, timestamp=timestamp)
+        else:
+            # Changed-only mode: the values are compared to the sent ones
+            self.last_values.update(values)
+
+    def flush(self):
+        """Send the batch (data built by the export method, if any).
+
+        Should raise an exception if the stats can not be exported.
+        """
+        data, self.batch = self.batch, []
+        records, self.batch_records = self.batch_records, []
+        if data:
+            self.send(data, records)
+
+    def send(self, data, records):
+        """Send the data of the batch (records: the matching exported stats).
+
+        Should raise an exception if the data can not be sent.
+        """
+        pass
+
+    def spool_append(self, name, columns, points, timestamp=None):
+        """Add stats to the spool (return False if the spool is disable)."""
+        if self.spool is None:
+            return False
+        try:
+            self.spool.append(timestamp or self.timestamp, name, columns, points)
+        except (IOError, OSError) as e:
+            logger.error("Cannot spool {} stats ({})".format(name, e))
+            return False
+        return True
+
+    def replay(self):
+        """Export the spooled stats (in order).
+
+        The number of stats exported is limited to spool_rate per second.
+        Return True if the spool is empty.
+        """
+        if self.spool is None or self.spool.empty():
+            return True
+        now = time()
+        nb = int((now - self.spool_last_replay) * self.spool_rate)
+        if nb < 1:
+            return False
+        self.spool_last_replay = now
+        records = self.spool.read(nb)
+        timestamp = self.timestamp
+        # The batched stats are sent after the spooled ones
+        batch, batch_records = self.batch, self.batch_records
+        self.batch, self.batch_records = [], []
+        try:
+            for self.timestamp, name, columns, points in records:
+                self.export(name, columns, points)
+            self.flush()
+        except Exception as e:
+            logger.debug("Cannot replay the {} export spool ({})".format(self.export_name, e))
+            return False
+        else:
+            self.spool.commit()
+            logger.debug("{} stats replayed from the {} export spool".format(len(records), self.export_name))
+        finally:
+            self.timestamp = timestamp
+            self.batch, self.batch_records = batch, batch_records
+        return self.spool.empty()
+
+    def export_or_spool(self, name, columns, points):
+        """Export the stats or add them to the spool.
+
+        While the spool is not empty, stats are added to the spool (to be
+        exported in order).
+        """
+        if self.spool is not None and not self.spool.empty():
+            self.spool_append(name, columns, points)
+            return
+        try:
+            self.export(name, columns, points)
+        except Exception as e:
+            logger.error("Cannot export {} stats using the {} module ({})".format(name, self.export_name, e))
+            self.spool_append(name, columns, points)
 
     def plugins_to_export(self):
         """Return the list of plugins to export."""
@@ -91,58 +300,48 @@ class GlancesExport(object):
         if not self.export_enable:
             return False
 
-        # Get all the stats & limits
-        all_stats = stats.getAllExports()
-        all_limits = stats.getAllLimits()
+        # Timestamp of the stats (snapshot of the stats, see StatsSnapshot)
+        self.timestamp = getattr(stats, 'timestamp', None) or time()
+
+        # Export the spooled stats first
+        self.replay()
+
         # Get the plugins list
         plugins = stats.getAllPlugins()
 
+        if hasattr(stats, 'get_export_data'):
+            # Names and values are built once per snapshot (see StatsSnapshot)
+            get_export_data = stats.get_export_data
+        else:
+            all_stats = dict(zip(plugins, stats.getAllExports()))
+            all_limits = dict(zip(plugins, stats.getAllLimits()))
+
+            def get_export_data(plugin):
+                if not isinstance(all_stats[plugin], (dict, list)):
+                    return None
+                return build_export(plugin, all_stats[plugin], all_limits[plugin])
+
+        # Full export every full_refresh cycles (changed-only mode)
+        full = self.cycles % self.full_refresh == 0
+        self.cycles += 1
+
         # Loop over available plugins
-        for i, plugin in enumerate(plugins):
+        for plugin in plugins:
             if plugin in self.plugins_to_export():
-                if isinstance(all_stats[i], dict):
-                    all_stats[i].update(all_limits[i])
-                elif isinstance(all_stats[i], list):
-                    all_stats[i] += all_limits[i]
-                else:
+                data = get_export_data(plugin)
+                if data is None:
                     continue
-                export_names, export_values = self.__build_export(all_stats[i])
-                self.export(plugin, export_names, export_values)
+                export_names, export_values = data
+                if self.changed_only:
+                    export_names, export_values = self.filter_changed(plugin, export_names, export_values,
+                                                                      full=full)
+                    if not export_names:
+                        continue
+                self.export_or_spool(plugin, export_names, export_values)
 
-        return True
+        # Send the batch (if the export method uses batch_append)
+        self.batch_cycles += 1
+        if self.batch_needed():
+            self.write_batch()
 
-    def __build_export(self, stats):
-        """Build the export lists."""
-        export_names = []
-        export_values = []
-
-        if isinstance(stats, dict):
-            # Stats is a dict
-            # Is there a key ?
-            if 'key' in iterkeys(stats):
-                pre_key = '{}.'.format(stats[stats['key']])
-            else:
-                pre_key = ''
-            # Walk through the dict
-            for key, value in iteritems(stats):
-                if isinstance(value, list):
-                    try:
-                        value = value[0]
-                    except IndexError:
-                        value = ''
-                if isinstance(value, dict):
-                    item_names, item_values = self.__build_export(value)
-                    item_names = [pre_key + key.lower() + str(i) for i in item_names]
-                    export_names += item_names
-                    export_values += item_values
-                else:
-                    export_names.append(pre_key + key.lower())
-                    export_values.append(value)
-        elif isinstance(stats, list):
-            # Stats is a list (of dict)
-            # Recursive loop through the list
-            for item in stats:
-                item_names, item_values = self.__build_export(item)
-                export_names += item_names
-                export_values += item_values
-        return export_names, export_values
+        return True
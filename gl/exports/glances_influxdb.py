@@ -4,6 +4,7 @@
 """InfluxDB interface class."""
 
 import sys
+from time import time
 
 from gl.compat import NoOptionError, NoSectionError
 from gl.logger import logger
@@ -18,6 +19,9 @@ from influxdb.influxdb08.client import InfluxDBClientError as InfluxDBClientErro
 INFLUXDB_08 = '0.8'
 INFLUXDB_09PLUS = '0.9+'
 
+# Timestamps precision (number of units per second)
+PRECISIONS = {'s': 1, 'ms': 1000, 'u': 1000000}
+
 
 class Export(GlancesExport):
 
@@ -35,10 +39,14 @@ class Export(GlancesExport):
         self.db = None
         self.prefix = None
         self.tags = None
+        self.precision = 's'
         self.export_enable = self.load_conf()
         if not self.export_enable:
             sys.exit(2)
 
+        # Tags are parsed once
+        self.dtags = self.parse_tags(self.tags)
+
         # Init the InfluxDB client
         self.client = self.init()
 
@@ -73,6 +81,22 @@ class Export(GlancesExport):
         except NoOptionError:
             pass
 
+        # Batch is optional: write the points every batch_size refresh
+        # or batch_timeout seconds
+        try:
+            self.batch_size = max(1, int(self.config.get_value(section, 'batch_size', default=1)))
+            batch_timeout = self.config.get_value(section, 'batch_timeout')
+            if batch_timeout is not None:
+                self.batch_timeout = float(batch_timeout)
+        except ValueError as e:
+            logger.critical("Error in the InfluxDB configuration (%s)" % e)
+            return False
+        precision = self.config.get_value(section, 'precision', default=self.precision)
+        if precision not in PRECISIONS:
+            logger.critical("Error in the InfluxDB configuration (precision should be one of %s)" % ', '.join(PRECISIONS))
+            return False
+        self.precision = precision
+
         return True
 
     def init(self):
@@ -111,29 +135,37 @@ class Export(GlancesExport):
 
         return db
 
+    def send(self, data, records):
+        """Write the points of the batch to the InfluxDB server."""
+        logger.debug("Export {} points to InfluxDB".format(len(data)))
+        self.client.write_points(data, time_precision=self.precision)
+
     def export(self, name, columns, points):
-        """Write the points to the InfluxDB server."""
+        """Add the points to the batch."""
         logger.debug("Export {} stats to InfluxDB".format(name))
         # Manage prefix
+        measurement = name
         if self.prefix is not None:
-            name = self.prefix + '.' + name
+            measurement = self.prefix + '.' + name
+        timestamp = int((self.timestamp or time()) * PRECISIONS[self.precision])
         # Create DB input
         if self.version == INFLUXDB_08:
-            data = [{'name': name, 'columns': columns, 'points': [points]}]
+            point = {'name': measurement,
+                     'columns': columns + ['time'],
+                     'points': [list(points) + [timestamp]]}
         else:
             # Convert all int to float (mandatory for InfluxDB>0.9.2)
             # Correct issue#750 and issue#749
-            for i, _ in enumerate(points):
+            fields = {}
+            for column, value in zip(columns, points):
                 try:
-                    points[i] = float(points[i])
+                    fields[column] = float(value)
                 except (TypeError, ValueError) as e:
-                    logger.debug("InfluxDB error during stat convertion %s=%s (%s)" % (columns[i], points[i], e))
-
-            data = [{'measurement': name,
-                     'tags': self.parse_tags(self.tags),
-                     'fields': dict(zip(columns, points))}]
-        # Write input to the InfluxDB database
-        try:
-            self.client.write_points(data)
-        except Exception as e:
-            logger.error("Cannot export {} stats to InfluxDB ({})".format(name, e))
+                    logger.debug("InfluxDB error during stat convertion %s=%s (%s)" % (column, value, e))
+                    fields[column] = value
+
+            point = {'measurement': measurement,
+                     'tags': self.dtags,
+                     'time': timestamp,
+                     'fields': fields}
+        self.batch_append(name, columns, points, [point])
@@ -3,19 +3,27 @@
 
 """OpenTSDB interface class."""
 
+import re
+import socket
 import sys
 from numbers import Number
+from time import time
 
-from gl.compat import NoOptionError, NoSectionError, range
+from gl.compat import NoOptionError, NoSectionError
 from gl.logger import logger
 from gl.exports.glances_export import GlancesExport
 
-import potsdb
+# Characters not allowed in the OpenTSDB metrics names and tags
+RE_INVALID = re.compile(r'[^a-zA-Z0-9\-_./]')
 
 
 class Export(GlancesExport):
 
-    """This class manages the OpenTSDB export module."""
+    """This class manages the OpenTSDB export module.
+
+    Stats are sent with the telnet style 'put' command, all the stats of
+    a refresh in a single write on a persistent connection.
+    """
 
     def __init__(self, config=None, args=None):
         """Init the OpenTSDB export IF."""
@@ -34,6 +42,12 @@ class Export(GlancesExport):
         if self.prefix is None:
             self.prefix = 'glances'
 
+        # Tags are parsed once (OpenTSDB needs at least one tag)
+        dtags = {'host': socket.gethostname()}
+        dtags.update(self.parse_tags(self.tags))
+        self.tags_line = ' '.join('{}={}'.format(RE_INVALID.sub('_', k), RE_INVALID.sub('_', v))
+                                  for k, v in sorted(dtags.items()))
+
         # Init the OpenTSDB client
         self.client = self.init()
 
@@ -73,32 +87,43 @@ class Export(GlancesExport):
             return None
 
         try:
-            db = potsdb.Client(self.host,
-                               port=int(self.port),
-                               check_host=True)
+            db = socket.create_connection((self.host, int(self.port)), timeout=10)
         except Exception as e:
             logger.critical("Cannot connect to OpenTSDB server %s:%s (%s)" % (self.host, self.port, e))
             sys.exit(2)
 
         return db
 
+    def build_name(self, name, column):
+        """Return the OpenTSDB metric name of a column of the plugin."""
+        return RE_INVALID.sub('_', '{}.{}.{}'.format(self.prefix, name, column))
+
+    def send(self, data, records):
+        """Send the lines (all the stats of the refresh) at once (reconnect if needed)."""
+        if self.client is None:
+            self.client = socket.create_connection((self.host, int(self.port)), timeout=10)
+        try:
+            self.client.sendall(''.join(data).encode('utf-8'))
+        except (IOError, OSError):
+            # Reconnect at the next send
+            self.client.close()
+            self.client = None
+            raise
+
     def export(self, name, columns, points):
-        """Export the stats to the Statsd server."""
-        for i in range(len(columns)):
-            if not isinstance(points[i], Number):
-                continue
-            stat_name = '{}.{}.{}'.format(self.prefix, name, columns[i])
-            stat_value = points[i]
-            tags = self.parse_tags(self.tags)
-            try:
-                self.client.send(stat_name, stat_value, **tags)
-            except Exception as e:
-                logger.error("Can not export stats %s to OpenTSDB (%s)" % (name, e))
+        """Add the stats to the lines to send."""
+        timestamp = int(self.timestamp or time())
+        lines = ['put {} {} {} {}\n'.format(stat_name, timestamp, int(stat_value)
+                                            if isinstance(stat_value, bool) else stat_value, self.tags_line)
+                 for stat_name, stat_value in zip(self.get_names(name, columns), points)
+                 if isinstance(stat_value, Number)]
+        self.batch_append(name, columns, points, lines)
         logger.debug("Export {} stats to OpenTSDB".format(name))
 
     def exit(self):
         """Close the OpenTSDB export module."""
-        # Waits for all outstanding metrics to be sent and background thread closes
-        self.client.wait()
-        # Call the father method
+        # Call the father method (send the last stats)
         super(Export, self).exit()
+        # Close the connection
+        if self.client is not None:
+            self.client.close()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+
+"""Parquet interface class."""
+
+import os
+import re
+import sys
+from numbers import Integral, Real
+from time import time
+
+from gl.compat import text_type
+from gl.logger import logger
+from gl.exports.glances_export import GlancesExport
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Arrow type of the columns types
+ARROW_TYPES = {'bool': pa.bool_(),
+               'int': pa.int64(),
+               'float': pa.float64(),
+               'str': pa.string()}
+
+
+def value_type(value):
+    """Return the column type of a value (None for a null value)."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, Integral):
+        return 'int'
+    if isinstance(value, Real):
+        return 'float'
+    return 'str'
+
+
+def merge_types(type1, type2):
+    """Return the type of a column with values of type1 and type2."""
+    if type1 is None or type1 == type2:
+        return type2
+    if type2 is None:
+        return type1
+    if set((type1, type2)) == set(('int', 'float')):
+        return 'float'
+    return 'str'
+
+
+def cast_value(value, column_type):
+    """Cast a value to the column type."""
+    if value is None:
+        return None
+    if column_type == 'str':
+        return text_type(value)
+    if column_type == 'float':
+        return float(value)
+    return value
+
+
+class Export(GlancesExport):
+
+    """This class manages the Parquet export module.
+
+    One row is written per refresh, with one typed column per stat
+    (<plugin>.<stat>). Rows are buffered and written by row groups of
+    row_group_size rows. New columns (a new network interface, a new
+    container...) and type changes are handled by starting a new file
+    with the extended schema (missing values are null), so readers can
+    merge the files schemas.
+
+    Files are named <name>.<number>.parquet and rotated every rotate_time
+    seconds or when they reach rotate_size MB.
+    """
+
+    changed_only_support = False
+
+    def __init__(self, config=None, args=None):
+        """Init the Parquet export IF."""
+        super(Export, self).__init__(config=config, args=args)
+
+        # Parquet files name (and number)
+        self.root, self.ext = os.path.splitext(args.export_parquet)
+        self.ext = self.ext or '.parquet'
+
+        # Load the Parquet configuration
+        self.row_group_size = 60
+        self.compression = 'snappy'
+        self.rotate_size = 100
+        self.rotate_time = 86400
+        self.load_conf()
+
+        # Columns types (key: column name)
+        self.columns = {}
+        # Rows waiting to be written (and the current one)
+        self.rows = []
+        self.row = None
+        self.row_timestamp = None
+
+        # Current file
+        self.writer = None
+        self.writer_filename = None
+        self.writer_columns = None
+        self.writer_start = None
+        try:
+            self.number = self.__last_number() + 1
+            dirname = os.path.dirname(os.path.abspath(self.root))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+        except (IOError, OSError) as e:
+            logger.critical("Cannot create the Parquet files: {}".format(e))
+            sys.exit(2)
+
+        logger.info("Stats exported to Parquet files: {}.*{}".format(self.root, self.ext))
+
+        self.export_enable = True
+
+    def load_conf(self, section='parquet'):
+        """Load the Parquet configuration in the Glances configuration file."""
+        if self.config is None or not self.config.has_section(section):
+            return
+        self.row_group_size = max(1, int(self.config.get_float_value(section, 'row_group_size',
+                                                                     default=self.row_group_size)))
+        self.compression = self.config.get_value(section, 'compression', default=self.compression)
+        self.rotate_size = self.config.get_float_value(section, 'rotate_size', default=self.rotate_size)
+        self.rotate_time = self.config.get_float_value(section, 'rotate_time', default=self.rotate_time)
+        logger.debug("Load Parquet from the Glances configuration file")
+
+    def __last_number(self):
+        """Return the number of the last existing file (-1 if none)."""
+        dirname, basename = os.path.split(os.path.abspath(self.root))
+        if not os.path.isdir(dirname):
+            return -1
+        re_file = re.compile(r'^{}\.(\d+){}$'.format(re.escape(basename), re.escape(self.ext)))
+        numbers = [int(m.group(1)) for m in map(re_file.match, os.listdir(dirname)) if m]
+        return max(numbers) if numbers else -1
+
+    def exit(self):
+        """Write the buffered rows and close the Parquet file."""
+        self.end_row()
+        try:
+            self.write()
+        except Exception as e:
+            logger.error("Cannot write the Parquet file ({})".format(e))
+        self.close()
+        super(Export, self).exit()
+
+    def update(self, stats):
+        """Add the stats row of the snapshot."""
+        ret = super(Export, self).update(stats)
+        self.end_row()
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+        return ret
+
+    def export(self, name, columns, points):
+        """Add the stats of a plugin to the current row."""
+        if self.row_timestamp != self.timestamp:
+            self.end_row()
+        if self.row is None:
+            self.row = {}
+            self.row_timestamp = self.timestamp
+        for column, value in zip(columns, points):
+            if isinstance(value, (list, tuple)):
+                value = value[0] if value else None
+            column = '{}.{}'.format(name, column)
+            self.row[column] = value
+            self.columns[column] = merge_types(self.columns.get(column), value_type(value))
+
+    def end_row(self):
+        """End the current row (add it to the rows to write)."""
+        if self.row is not None:
+            self.rows.append((self.row_timestamp, self.row))
+            self.row = None
+            self.row_timestamp = None
+
+    def flush(self):
+        """Write the buffered rows (one row group)."""
+        self.write()
+
+    def write(self):
+        """Write the buffered rows in the current file (rotate it if needed)."""
+        if not self.rows:
+            return
+        if self.writer is not None and (
+                self.writer_columns != self.columns or
+                (self.rotate_time and time() - self.writer_start >= self.rotate_time) or
+                (self.rotate_size and os.path.getsize(self.writer_filename) >= self.rotate_size * 1024 * 1024)):
+            self.close()
+        if self.writer is None:
+            self.open()
+
+        names = sorted(self.writer_columns)
+        arrays = [pa.array([int(t * 1000) for t, _ in self.rows], type=pa.timestamp('ms', tz='UTC'))]
+        for column in names:
+            column_type = self.writer_columns[column]
+            arrays.append(pa.array([cast_value(row.get(column), column_type) for _, row in self.rows],
+                                   type=ARROW_TYPES[column_type or 'str']))
+        table = pa.Table.from_arrays(arrays, schema=self.writer.schema)
+        self.writer.write_table(table, row_group_size=len(self.rows))
+        self.rows = []
+
+    def open(self):
+        """Open a new file with the current columns schema."""
+        self.writer_columns = dict(self.columns)
+        schema = pa.schema([pa.field('timestamp', pa.timestamp('ms', tz='UTC'))] +
+                           [pa.field(column, ARROW_TYPES[self.writer_columns[column] or 'str'])
+                            for column in sorted(self.writer_columns)])
+        self.writer_filename = '{}.{:05d}{}'.format(self.root, self.number, self.ext)
+        self.number += 1
+        self.writer = pq.ParquetWriter(self.writer_filename, schema, compression=self.compression)
+        self.writer_start = time()
+        logger.debug("Stats exported to the Parquet file {}".format(self.writer_filename))
+
+    def close(self):
+        """Close the current file."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
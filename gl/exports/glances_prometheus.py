@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+
+"""Prometheus interface class."""
+
+import math
+import re
+import sys
+import threading
+from numbers import Number
+
+from gl.compat import BaseHTTPRequestHandler, HTTPServer, NoOptionError, NoSectionError, ThreadingMixIn, iteritems
+from gl.logger import logger
+from gl.exports.glances_export import GlancesExport
+
+# Characters not allowed in the metrics and labels names
+RE_INVALID = re.compile(r'[^a-zA-Z0-9_]')
+
+CONTENT_TYPE_OPENMETRICS = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+CONTENT_TYPE_TEXT = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    """Escape a label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def add_label(labels, name, value):
+    """Return the labels ({name="value",...} or '') with a new label."""
+    label = '{}="{}"'.format(RE_INVALID.sub('_', name), escape_label(value))
+    if not labels:
+        return '{' + label + '}'
+    return labels[:-1] + ',' + label + '}'
+
+
+def format_value(value):
+    """Return a sample value (NaN and infinities as NaN, +Inf and -Inf)."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+    return str(value)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+
+    """HTTP server of the /metrics page."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    """Serve the metrics rendered by the export module (server.export)."""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        # Rendered once per refresh, shared by all the requests
+        body = self.server.export.metrics
+        if 'application/openmetrics-text' in self.headers.get('Accept', ''):
+            content_type = CONTENT_TYPE_OPENMETRICS
+        else:
+            content_type = CONTENT_TYPE_TEXT
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Prometheus request from {}: {}".format(self.address_string(), format % args))
+
+
+class Export(GlancesExport):
+
+    """This class manages the Prometheus export module.
+
+    The stats are served in the OpenMetrics text format on the /metrics
+    page of an embedded HTTP server. The page is rendered once per
+    refresh. Metrics are named <prefix>_<plugin>_<stat>; for the plugins
+    with a key (see the plugin get_key method), the key is a label (else
+    the position of the item in the list, index label).
+    """
+
+    changed_only_support = False
+
+    def __init__(self, config=None, args=None):
+        """Init the Prometheus export IF."""
+        super(Export, self).__init__(config=config, args=args)
+
+        # Load the Prometheus configuration
+        self.host = None
+        self.port = None
+        self.prefix = 'glances'
+        self.export_enable = self.load_conf()
+        if not self.export_enable:
+            sys.exit(2)
+
+        # Metrics names (key: (plugin, stat), value: name)
+        self.names = {}
+        # Rendered metrics page
+        self.metrics = b'# EOF\n'
+
+        # Init the HTTP server
+        self.server = self.init()
+
+    def load_conf(self, section="prometheus"):
+        """Load the Prometheus configuration in the Glances configuration file."""
+        if self.config is None:
+            return False
+        try:
+            self.host = self.config.get_value(section, 'host')
+            self.port = int(self.config.get_value(section, 'port'))
+        except NoSectionError:
+            logger.critical("No Prometheus configuration found")
+            return False
+        except (NoOptionError, TypeError, ValueError) as e:
+            logger.critical("Error in the Prometheus configuration (%s)" % e)
+            return False
+        else:
+            logger.debug("Load Prometheus from the Glances configuration file")
+        self.prefix = self.config.get_value(section, 'prefix', default=self.prefix)
+        return True
+
+    def init(self):
+        """Start the HTTP server thread."""
+        if not self.export_enable:
+            return None
+        try:
+            server = MetricsServer((self.host, self.port), MetricsHandler)
+        except Exception as e:
+            logger.critical("Cannot start the Prometheus server on %s:%s (%s)" % (self.host, self.port, e))
+            sys.exit(2)
+        server.export = self
+        thread = threading.Thread(target=server.serve_forever, name='gl-prometheus')
+        thread.daemon = True
+        thread.start()
+        logger.info("Stats exported to Prometheus on http://{}:{}/metrics".format(self.host, self.port))
+        return server
+
+    def exit(self):
+        """Stop the HTTP server."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        super(Export, self).exit()
+
+    def get_name(self, plugin, stat):
+        """Return the metric name of a stat (built once)."""
+        try:
+            return self.names[(plugin, stat)]
+        except KeyError:
+            name = RE_INVALID.sub('_', '{}_{}_{}'.format(self.prefix, plugin, stat)).lower()
+            if name[0].isdigit():
+                name = '_' + name
+            self.names[(plugin, stat)] = name
+            return name
+
+    def add_samples(self, families, plugin, stats, labels, stat_prefix=''):
+        """Add the numeric stats of a dict to the families (key: name, value: samples list).
+
+        Each element of a list stat is a sample, with an 'element' label
+        (position in the list).
+        """
+        for stat, value in iteritems(stats):
+            if isinstance(value, dict):
+                self.add_samples(families, plugin, value, labels, stat_prefix + stat + '_')
+                continue
+            if isinstance(value, (list, tuple)):
+                samples = [(add_label(labels, 'element', i), v) for i, v in enumerate(value)]
+            else:
+                samples = [(labels, value)]
+            for sample_labels, sample_value in samples:
+                if isinstance(sample_value, bool):
+                    sample_value = int(sample_value)
+                elif not isinstance(sample_value, Number):
+                    continue
+                families.setdefault(self.get_name(plugin, stat_prefix + stat), []).append(
+                    (sample_labels, sample_value))
+
+    def update(self, stats):
+        """Render the metrics page of the snapshot."""
+        if not self.export_enable:
+            return False
+
+        families = {}
+        all_stats = stats.getAllExports()
+        for i, plugin in enumerate(stats.getAllPlugins()):
+            if plugin not in self.plugins_to_export():
+                continue
+            if isinstance(all_stats[i], dict):
+                self.add_samples(families, plugin, all_stats[i], '')
+            elif isinstance(all_stats[i], list):
+                key = stats.get_plugin(plugin).get_key()
+                for index, item in enumerate(all_stats[i]):
+                    if not isinstance(item, dict):
+                        continue
+                    item_key = key or item.get('key')
+                    if item_key in item:
+                        labels = add_label('', item_key, item[item_key])
+                        item = dict((k, v) for k, v in iteritems(item) if k not in (item_key, 'key'))
+                    else:
+                        # No key: the items are identified by their position
+                        labels = add_label('', 'index', index)
+                    self.add_samples(families, plugin, item, labels)
+
+        lines = []
+        for name in sorted(families):
+            lines.append('# TYPE {} gauge\n'.format(name))
+            lines += ['{}{} {}\n'.format(name, labels, format_value(value)) for labels, value in families[name]]
+        lines.append('# EOF\n')
+        self.metrics = ''.join(lines).encode('utf-8')
+        return True
@@ -7,6 +7,7 @@ import datetime
 import socket
 import sys
 from numbers import Number
+from time import time
 
 from gl.compat import NoOptionError, NoSectionError, range
 from gl.logger import logger
@@ -30,12 +31,22 @@ class Export(GlancesExport):
         self.rabbitmq_user = None
         self.rabbitmq_password = None
         self.rabbitmq_queue = None
+        # Publish the stats of a refresh in a single message
+        self.batch_enable = False
+        # Wait for the broker confirmation of the messages of a refresh
+        # (one network round trip per refresh)
+        self.confirm = False
         self.hostname = socket.gethostname()
         self.export_enable = self.load_conf()
         if not self.export_enable:
             sys.exit(2)
 
-        # Init the rabbitmq client
+        # Reconnection delay (doubled after each failed connection)
+        self.reconnect_delay = 1
+        self.reconnect_time = 0
+
+        # Init the rabbitmq client (one connection and channel)
+        self.connection = None
         self.client = self.init()
 
     def load_conf(self, section="rabbitmq"):
@@ -56,6 +67,8 @@ class Export(GlancesExport):
             return False
         else:
             logger.debug("Load RabbitMQ from the Glances configuration file")
+        self.batch_enable = self.config.get_value(section, 'batch', default='false').lower() == 'true'
+        self.confirm = self.config.get_value(section, 'confirm', default='false').lower() == 'true'
         return True
 
     def init(self):
@@ -68,24 +81,83 @@ class Export(GlancesExport):
                 ':' + self.rabbitmq_password +
                 '@' + self.rabbitmq_host +
                 ':' + self.rabbitmq_port + '/')
-            connection = pika.BlockingConnection(parameters)
-            channel = connection.channel()
-            return channel
+            self.connection = pika.BlockingConnection(parameters)
+            channel = self.connection.channel()
+            if self.confirm:
+                # The messages of a refresh are confirmed at once (see send)
+                channel.tx_select()
         except Exception as e:
             logger.critical("Connection to rabbitMQ failed : %s " % e)
+            self.close()
+            # Next connection after reconnect_delay seconds
+            self.reconnect_time = time() + self.reconnect_delay
+            self.reconnect_delay = min(self.reconnect_delay * 2, 60)
             return None
+        self.reconnect_delay = 1
+        return channel
+
+    def close(self):
+        """Close the connection to the rabbitmq server."""
+        connection, self.connection, self.client = self.connection, None, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def get_client(self):
+        """Return the channel (reconnect to the rabbitmq server if needed)."""
+        if self.client is None or not self.client.is_open:
+            if time() < self.reconnect_time:
+                raise IOError("Not connected to rabbitMQ (next connection in {:.0f} seconds)".format(
+                    self.reconnect_time - time()))
+            self.close()
+            self.client = self.init()
+            if self.client is None:
+                raise IOError("Not connected to rabbitMQ")
+        return self.client
+
+    def exit(self):
+        """Publish the last messages and close the connection."""
+        super(Export, self).exit()
+        self.close()
+
+    def send(self, data, records):
+        """Publish the messages of the refresh.
+
+        In batch mode, the stats of all the plugins are published in a
+        single message (one line per plugin).
+
+        With confirm, the messages are published in a transaction: the
+        commit waits (once) for the broker to accept all of them.
+        """
+        if self.batch_enable:
+            data = ['\n'.join(data)]
+        client = self.get_client()
+        try:
+            for body in data:
+                client.basic_publish(exchange='', routing_key=self.rabbitmq_queue, body=body)
+            if self.confirm:
+                client.tx_commit()
+        except Exception:
+            # Reconnect at the next refresh
+            self.close()
+            raise
 
     def export(self, name, columns, points):
-        """Write the points in RabbitMQ."""
+        """Add the points to the messages of the refresh."""
         data = ('hostname=' + self.hostname + ', name=' + name +
-                ', dateinfo=' + datetime.datetime.utcnow().isoformat())
+                ', dateinfo=' + self.get_utc_date().isoformat())
         for i in range(len(columns)):
             if not isinstance(points[i], Number):
                 continue
             else:
                 data += ", " + columns[i] + "=" + str(points[i])
         logger.debug(data)
-        try:
-            self.client.basic_publish(exchange='', routing_key=self.rabbitmq_queue, body=data)
-        except Exception as e:
-            logger.error("Can not export stats to RabbitMQ (%s)" % e)
+        self.batch_append(name, columns, points, [data])
+
+    def get_utc_date(self):
+        """Return the UTC date of the exported stats."""
+        if self.timestamp is None:
+            return datetime.datetime.utcnow()
+        return datetime.datetime.utcfromtimestamp(self.timestamp)
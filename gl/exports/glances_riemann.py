@@ -7,7 +7,7 @@ import socket
 import sys
 from numbers import Number
 
-from gl.compat import NoOptionError, NoSectionError, range
+from gl.compat import NoOptionError, NoSectionError
 from gl.logger import logger
 from gl.exports.glances_export import GlancesExport
 
@@ -62,15 +62,28 @@ class Export(GlancesExport):
             logger.critical("Connection to Riemann failed : %s " % e)
             return None
 
+    def build_name(self, name, column):
+        """Return the Riemann service name of a column of the plugin."""
+        return name + " " + column
+
+    def send(self, events, records):
+        """Send the events (all the stats of the refresh) in a single Riemann message."""
+        message = bernhard.Message(events=[bernhard.Event(params=e) for e in events])
+        if not self.client.transmit(message).ok:
+            raise IOError("Events not accepted by Riemann")
+
     def export(self, name, columns, points):
-        """Write the points in Riemann."""
-        for i in range(len(columns)):
-            if not isinstance(points[i], Number):
+        """Add the points to the events of the refresh."""
+        events = []
+        base = {'host': self.hostname}
+        if self.timestamp is not None:
+            base['time'] = int(self.timestamp)
+        for service, metric in zip(self.get_names(name, columns), points):
+            if not isinstance(metric, Number):
                 continue
-            else:
-                data = {'host': self.hostname, 'service': name + " " + columns[i], 'metric': points[i]}
-                logger.debug(data)
-                try:
-                    self.client.send(data)
-                except Exception as e:
-                    logger.error("Cannot export stats to Riemann (%s)" % e)
+            data = dict(base)
+            data['service'] = service
+            data['metric'] = metric
+            events.append(data)
+        self.batch_append(name, columns, points, events)
+        logger.debug("Export {} stats to Riemann".format(name))
@@ -6,7 +6,7 @@
 import sys
 from numbers import Number
 
-from gl.compat import NoOptionError, NoSectionError, range
+from gl.compat import NoOptionError, NoSectionError
 from gl.logger import logger
 from gl.exports.glances_export import GlancesExport
 
@@ -25,6 +25,8 @@ class Export(GlancesExport):
         self.host = None
         self.port = None
         self.prefix = None
+        # Maximum size of the UDP packets (IP and UDP headers included)
+        self.mtu = 1500
         self.export_enable = self.load_conf()
         if not self.export_enable:
             sys.exit(2)
@@ -34,9 +36,8 @@ class Export(GlancesExport):
             self.prefix = 'glances'
 
         # Init the Statsd client
-        self.client = StatsClient(self.host,
-                                  int(self.port),
-                                  prefix=self.prefix)
+        # Stats of a refresh are sent in packets of (at most) mtu bytes
+        self.client = self.init(self.prefix)
 
     def load_conf(self, section="statsd"):
         """Load the Statsd configuration in the Glances configuration file."""
@@ -58,25 +59,30 @@ class Export(GlancesExport):
             self.prefix = self.config.get_value(section, 'prefix')
         except NoOptionError:
             pass
+        self.mtu = int(self.config.get_float_value(section, 'mtu', default=self.mtu))
         return True
 
     def init(self, prefix='glances'):
         """Init the connection to the Statsd server."""
         if not self.export_enable:
             return None
+        # 28 bytes for the IP and UDP headers
         return StatsClient(self.host,
-                           self.port,
-                           prefix=prefix)
+                           int(self.port),
+                           prefix=prefix,
+                           maxudpsize=max(64, self.mtu - 28))
+
+    def send(self, data, records):
+        """Send the stats of the refresh (in pipelined packets)."""
+        pipe = self.client.pipeline()
+        for stat_name, stat_value in data:
+            pipe.gauge(stat_name, stat_value)
+        pipe.send()
 
     def export(self, name, columns, points):
-        """Export the stats to the Statsd server."""
-        for i in range(len(columns)):
-            if not isinstance(points[i], Number):
-                continue
-            stat_name = '{}.{}'.format(name, columns[i])
-            stat_value = points[i]
-            try:
-                self.client.gauge(stat_name, stat_value)
-            except Exception as e:
-                logger.error("Can not export stats to Statsd (%s)" % e)
+        """Add the stats to the batch (gauges sent by the send method)."""
+        self.batch_append(name, columns, points,
+                          [(stat_name, stat_value)
+                           for stat_name, stat_value in zip(self.get_names(name, columns), points)
+                           if isinstance(stat_value, Number)])
         logger.debug("Export {} stats to Statsd".format(name))
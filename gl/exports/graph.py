@@ -23,8 +23,10 @@ class GlancesGraph(object):
 
     """Thanks to this class, Glances can export history to graphs."""
 
-    def __init__(self, output_folder):
+    def __init__(self, output_folder, span=None):
         self.output_folder = output_folder
+        # Time span of the graphs in seconds (None for the whole raw history)
+        self.span = span
 
     def get_output_folder(self):
         """Return the output folder where the graph are generated."""
@@ -80,7 +82,7 @@ class GlancesGraph(object):
         index_all = 0
         for p in stats.getAllPlugins():
             # History
-            h = stats.get_plugin(p).get_export_history()
+            h = stats.get_plugin(p).get_export_history(span=self.span)
             # Current plugin item history list
             ih = stats.get_plugin(p).get_items_history_list()
             # Check if we must process history
@@ -2,40 +2,623 @@
 
 """Manage stats history"""
 
-from gl.attribute import GlancesAttribute
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+from array import array
+from datetime import datetime
+from time import time
+
+from gl.compat import PY3, range
+from gl.logger import logger
+
+NAN = float('nan')
+
+# All the history stores (see the new_history_tick function)
+_stores = weakref.WeakSet()
+
+
+def new_history_tick(timestamp=None):
+    """Start a new refresh tick in all the history stores."""
+    timestamp = timestamp or time()
+    for store in list(_stores):
+        store.new_tick(timestamp)
+
+
+class GlancesHistoryStore(object):
+
+    """This class stores the history of all the plugins in columns.
+
+    - one timestamp column (one value per refresh tick)
+    - one value column per series (key: (plugin name, stats name))
+
+    Columns are float arrays used as ring buffers (NaN if the series has
+    no value for a tick: series added later, plugin not refreshed...).
+    Series without value in the whole history are dropped.
+    """
+
+    # Initial size of the columns (grow up to max_size)
+    _init_size = 64
+
+    def __init__(self, max_size=28800):
+        self.max_size = int(max_size)
+        self._lock = threading.Lock()
+        # Downsampled history (see set_rollups)
+        self._rollups = []
+        self._open()
+
+    def _open(self):
+        """Init the columns."""
+        self.reset()
+
+    def reset(self):
+        """Reset the whole history."""
+        with self._lock:
+            self._size = min(self._init_size, self.max_size)
+            self._ticks = array('d', [0.0]) * self._size
+            # Position of the oldest tick and number of ticks
+            self._start = 0
+            self._len = 0
+            # Number of ticks since the beginning (absolute tick number)
+            self._count = 0
+            # Timestamp of the next tick (see new_tick)
+            self._next_tick = None
+            # Series: key -> [values column, int values tag, last tick number]
+            self._series = {}
+
+    def __len__(self):
+        """Return the number of ticks in the history."""
+        return self._len
+
+    def set_max_size(self, max_size):
+        """Increase the maximum number of ticks in the history."""
+        if max_size is not None and int(max_size) > self.max_size:
+            self.max_size = int(max_size)
+
+    def set_rollups(self, rollups):
+        """Set the downsampled history.
+
+        rollups: list of (period, size), period in seconds and size the
+        maximum number of periods (min/avg/max values) in the history
+        """
+        rollups = sorted((int(p), int(s)) for p, s in rollups)
+        with self._lock:
+            if rollups == [(r.period, r.store.max_size) for r in self._rollups]:
+                return
+            self._rollups = [GlancesHistoryRollup(p, self._new_rollup_store(p, s))
+                             for p, s in rollups]
+
+    def _new_rollup_store(self, period, size):
+        """Return the store of the downsampled history (period seconds)."""
+        return GlancesHistoryStore(max_size=size)
+
+    def new_tick(self, timestamp=None):
+        """Start a new refresh tick.
+
+        The tick is only stored when the first value is added to it.
+        """
+        self._next_tick = timestamp or time()
+
+    def __add_tick(self):
+        """Store the pending tick (called with the lock)."""
+        if self._len == self._size and self._size < self.max_size:
+            self._grow()
+        if self._len < self._size:
+            self._len += 1
+        else:
+            # History is full, forget the oldest tick
+            self._start = (self._start + 1) % self._size
+        self._count += 1
+        pos = self._position(0)
+        self._ticks[pos] = self._next_tick
+        self._next_tick = None
+        # Clear the current position for all the series
+        # and drop the series without values in the history
+        for key in list(self._series):
+            column = self._series[key]
+            if column[2] <= self._count - self._len:
+                self._del_series(key)
+            else:
+                column[0][pos] = NAN
+        self._sync()
+
+    def _grow(self):
+        """Double the size of the columns (up to max_size)."""
+        size = min(self._size * 2, self.max_size)
+        columns = [self._ticks] + [c[0] for c in self._series.values()]
+        for column in columns:
+            if self._start != 0:
+                # Unwrap the ring buffer
+                column[:] = column[self._start:] + column[:self._start]
+            column.extend(array('d', [NAN]) * (size - self._size))
+        self._start = 0
+        self._size = size
+
+    def _position(self, offset):
+        """Return the position of the tick offset (0 is the latest tick)."""
+        return (self._start + self._len - 1 - offset) % self._size
+
+    def _new_series(self, key):
+        """Create and return the column of the series key."""
+        column = self._series[key] = [array('d', [NAN]) * self._size, True, 0]
+        return column
+
+    def _del_series(self, key):
+        """Delete the series key."""
+        del self._series[key]
+
+    def _update_series(self, key):
+        """Called when the type of the series key changes."""
+        pass
+
+    def _sync(self):
+        """Called when a new tick is stored."""
+        pass
+
+    def add(self, key, value):
+        """Add the value of the series key for the current tick."""
+        with self._lock:
+            column = self._series.get(key)
+            if self._next_tick is None and \
+                    (self._len == 0 or (column is not None and column[2] == self._count)):
+                # No tick started (or the series already has a value in
+                # the current tick): start a new one
+                self._next_tick = time()
+            if self._next_tick is not None:
+                self.__add_tick()
+                column = self._series.get(key)
+            if column is None:
+                # New series
+                column = self._new_series(key)
+            if value is None:
+                value = NAN
+            elif column[1] and (not isinstance(value, int) or isinstance(value, bool)):
+                column[1] = False
+                self._update_series(key)
+            pos = self._position(0)
+            column[0][pos] = value
+            column[2] = self._count
+            for rollup in self._rollups:
+                rollup.add(self._ticks[pos], key, value)
+
+    def remove(self, key):
+        """Remove the series key."""
+        with self._lock:
+            if key in self._series:
+                self._del_series(key)
+            for rollup in self._rollups:
+                rollup.remove(key)
+
+    def keys(self):
+        """Return the series keys."""
+        with self._lock:
+            return list(self._series)
+
+    def interval(self):
+        """Return the mean time between two ticks (None if unknown)."""
+        with self._lock:
+            return self._interval()
+
+    def _interval(self):
+        """Return the mean time between two ticks (called with the lock)."""
+        if self._len < 2:
+            return None
+        return (self._ticks[self._position(0)] - self._ticks[self._position(self._len - 1)]) / (self._len - 1)
+
+    def select(self, nb=0, span=None):
+        """Return the rollup (None for the raw history) to read the last
+        nb values (all if nb=0) or the last span seconds.
+
+        The raw history is used if it covers the span, else the finest
+        rollup covering it (or the coarsest one).
+        """
+        with self._lock:
+            return self._select(nb=nb, span=span)
+
+    def _select(self, nb=0, span=None):
+        """Return the rollup to read (see select, called with the lock)."""
+        if not self._rollups:
+            return None
+        if span is None:
+            interval = self._interval()
+            if nb <= self._len or interval is None:
+                return None
+            span = nb * interval
+        if self._len < self.max_size or \
+                time() - span >= self._ticks[self._position(self._len - 1)]:
+            # The raw history is not full or covers the span
+            return None
+        for rollup in self._rollups:
+            if rollup.period * rollup.store.max_size >= span:
+                return rollup
+        return self._rollups[-1]
+
+    def get(self, key, nb=0, json=False, span=None, aggregate='avg'):
+        """Return the last nb values (all if nb=0) of the series key.
+
+        Values are returned as a list of (datetime, value) tuples, with
+        ISO formatted dates if json is True.
+
+        If span is set (or if nb is greater than the raw history size), only
+        the values of the last span seconds are returned, read from the raw
+        history or from the downsampled one (aggregate: min, avg or max).
+        """
+        with self._lock:
+            rollup = self._select(nb=nb, span=span)
+            if rollup is not None and span is None:
+                span = nb * self._interval()
+        if rollup is not None:
+            # The rollup store has its own lock
+            return rollup.store.get(key + (aggregate,), nb=nb, json=json, span=span)
+        return self.__get(key, nb=nb, json=json,
+                          since=None if span is None else time() - span)
+
+    def __get(self, key, nb=0, json=False, since=None):
+        ret = []
+        with self._lock:
+            try:
+                column, int_values, _ = self._series[key]
+            except KeyError:
+                return ret
+            for offset in range(self._len):
+                pos = self._position(offset)
+                if since is not None and self._ticks[pos] < since:
+                    break
+                v = column[pos]
+                if v != v:
+                    # NaN: no value for this tick
+                    continue
+                ret.append((self._ticks[pos], int(v) if int_values else v))
+                if len(ret) == nb:
+                    break
+        ret.reverse()
+        if json:
+            return [(datetime.fromtimestamp(d).isoformat(), v) for d, v in ret]
+        return [(datetime.fromtimestamp(d), v) for d, v in ret]
+
+
+class GlancesHistoryRollup(object):
+
+    """Downsampled history: min, avg and max values of the series per period.
+
+    Values are aggregated as they are added. The aggregates of a period are
+    stored (in the store, as the (key..., 'min'|'avg'|'max') series) when the
+    first value of the next period is added.
+    """
+
+    def __init__(self, period, store):
+        self.period = period
+        self.store = store
+        # Start time of the current period
+        self._start = None
+        # Current period aggregates (key: [min, max, sum, count])
+        self._values = {}
+
+    def add(self, timestamp, key, value):
+        """Add the value (at timestamp) of the series key."""
+        start = timestamp - timestamp % self.period
+        if start != self._start:
+            self.flush()
+            self._start = start
+        if value != value:
+            # NaN
+            return
+        try:
+            v = self._values[key]
+        except KeyError:
+            self._values[key] = [value, value, value, 1]
+        else:
+            if value < v[0]:
+                v[0] = value
+            if value > v[1]:
+                v[1] = value
+            v[2] += value
+            v[3] += 1
+
+    def flush(self):
+        """Store the aggregates of the current period."""
+        if not self._values:
+            return
+        self.store.new_tick(self._start)
+        for key, (vmin, vmax, vsum, count) in self._values.items():
+            self.store.add(key + ('min',), vmin)
+            self.store.add(key + ('avg',), vsum / float(count))
+            self.store.add(key + ('max',), vmax)
+        self._values = {}
+
+    def remove(self, key):
+        """Remove the series key."""
+        self._values.pop(key, None)
+        for aggregate in ('min', 'avg', 'max'):
+            self.store.remove(key + (aggregate,))
+
+
+# History store shared by all the plugins
+history_store = GlancesHistoryStore()
+
+
+class MmapColumn(object):
+
+    """Float column in a memory mapped file.
+
+    Only used with Python 2 (memoryview.cast is used with Python 3).
+    """
+
+    _item = struct.Struct('d')
+
+    def __init__(self, buf, offset, size):
+        self.buf = buf
+        self.offset = offset
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, pos):
+        return self._item.unpack_from(self.buf, self.offset + pos * 8)[0]
+
+    def __setitem__(self, pos, value):
+        self._item.pack_into(self.buf, self.offset + pos * 8, value)
+
+    def release(self):
+        pass
+
+
+class GlancesMmapHistoryStore(GlancesHistoryStore):
+
+    """This class stores the history in a memory mapped file.
+
+    File format:
+    - header: magic, header size, max size (number of ticks), number of
+      columns, start, len, count
+    - series table: JSON list of [key, column number, int values tag]
+    - columns: the ticks timestamps, then the series values (max size
+      floats per column, NaN if no value)
+
+    Columns are read and written directly in the mapping. The history is
+    reloaded when the store is created (history survives restarts).
+    """
+
+    _magic = b'GLHIST01'
+    _header = struct.Struct('<8sIIIIIQ')
+
+    # Initial number of series columns and header size (grow if needed)
+    _init_capacity = 16
+    _init_header_size = 16384
+
+    def __init__(self, path, max_size=28800):
+        self.path = path
+        self._file = None
+        self._mmap = None
+        self._columns = []
+        super(GlancesMmapHistoryStore, self).__init__(max_size=max_size)
+
+    def _open(self):
+        """Load the history file (create it if needed)."""
+        self._next_tick = None
+        self._count = 0
+        try:
+            self.__load()
+        except Exception as e:
+            if os.path.exists(self.path):
+                logger.warning("Cannot load history file {} ({})".format(self.path, e))
+            self.reset()
+        else:
+            logger.debug("History file {} loaded ({} ticks)".format(self.path, self._len))
+
+    def reset(self):
+        """Reset the whole history (truncate the history file)."""
+        with self._lock:
+            self.__create(self._init_capacity, self._init_header_size)
+
+    def set_max_size(self, max_size):
+        """The maximum number of ticks is set when the file is created."""
+        pass
+
+    def _new_rollup_store(self, period, size):
+        """Store the downsampled history in <name>.<period>s.history."""
+        path = '{}.{}s.history'.format(os.path.splitext(self.path)[0], period)
+        return GlancesMmapHistoryStore(path, max_size=size)
+
+    def __map(self, capacity, header_size):
+        """Map the history file."""
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._capacity = capacity
+        self._header_size = header_size
+        self._size = self.max_size
+        self._columns = []
+        for i in range(capacity + 1):
+            offset = header_size + i * self._size * 8
+            if PY3:
+                self._columns.append(memoryview(self._mmap)[offset:offset + self._size * 8].cast('d'))
+            else:
+                self._columns.append(MmapColumn(self._mmap, offset, self._size))
+        self._ticks = self._columns[0]
+        # Series column number and free columns
+        self._index = {}
+        self._free = list(range(1, capacity + 1))
+
+    def __close(self):
+        """Unmap and close the history file."""
+        for column in self._columns:
+            column.release()
+        self._columns = []
+        self._series = {}
+        self._ticks = None
+        self._mmap.close()
+        self._file.close()
+        self._file = self._mmap = None
+
+    def __load(self):
+        """Load an existing history file."""
+        self._file = open(self.path, 'r+b')
+        try:
+            header = self._file.read(self._header.size)
+            magic, header_size, size, capacity, start, length, count = self._header.unpack(header)
+            if magic != self._magic:
+                raise ValueError('bad file format')
+            if size != self.max_size:
+                raise ValueError('history size changed from {} to {}'.format(size, self.max_size))
+            table = self._file.read(header_size - self._header.size).rstrip(b'\0')
+            table = json.loads(table.decode('utf-8'))
+            self.__map(capacity, header_size)
+        except Exception:
+            self._file.close()
+            self._file = None
+            raise
+        self._start, self._len, self._count = start, length, count
+        self._series = {}
+        for key, index, int_values in table:
+            key = tuple(key)
+            # The last tick of the series is not stored, consider it is
+            # the current one
+            self._series[key] = [self._columns[index], bool(int_values), count]
+            self._index[key] = index
+            self._free.remove(index)
+
+    def __create(self, capacity, header_size, data=None):
+        """Create the history file (called with the lock).
+
+        data: history to copy in the new file (see __dump)
+        """
+        if self._file is not None:
+            self.__close()
+        dirname = os.path.dirname(self.path)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # Create a sparse file
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.truncate(header_size + (capacity + 1) * self.max_size * 8)
+        os.rename(tmp_path, self.path)
+        self._file = open(self.path, 'r+b')
+        self.__map(capacity, header_size)
+        self._series = {}
+        self._start = 0
+        self._len = 0
+        if data is not None:
+            ticks, series = data
+            self._len = len(ticks)
+            self.__write(0, ticks)
+            for key, (values, int_values, last) in series.items():
+                column = self.__new_column(key)
+                column[1:] = [int_values, last]
+                self.__write(self._index[key], values)
+        self.__write_table()
+        self._sync()
+
+    def __dump(self):
+        """Return the history (ticks, series) in chronological order."""
+        positions = [self._position(offset) for offset in range(self._len - 1, -1, -1)]
+        ticks = [self._ticks[p] for p in positions]
+        series = dict((key, ([column[p] for p in positions], int_values, last))
+                      for key, (column, int_values, last) in self._series.items())
+        return ticks, series
+
+    def __write(self, index, values):
+        """Write values at the beginning of the column index (NaN after)."""
+        values = array('d', values) + array('d', [NAN]) * (self.max_size - len(values))
+        offset = self._header_size + index * self.max_size * 8
+        self._mmap[offset:offset + self.max_size * 8] = values.tobytes() if PY3 else values.tostring()
+
+    def __write_table(self):
+        """Write the series table (grow the header if needed)."""
+        table = json.dumps([[list(key), self._index[key], int(column[1])]
+                            for key, column in self._series.items()]).encode('utf-8')
+        if len(table) > self._header_size - self._header.size:
+            header_size = self._header_size
+            while len(table) > header_size - self._header.size:
+                header_size *= 2
+            logger.debug("Grow the history file {} header to {} bytes".format(self.path, header_size))
+            self.__create(self._capacity, header_size, self.__dump())
+            return
+        self._mmap[self._header.size:self._header_size] = table.ljust(self._header_size - self._header.size, b'\0')
+
+    def _sync(self):
+        """Write the ring buffer state in the header."""
+        self._mmap[:self._header.size] = self._header.pack(
+            self._magic, self._header_size, self._size, self._capacity,
+            self._start, self._len, self._count)
+
+    def __new_column(self, key):
+        """Affect a free column to the series key."""
+        if not self._free:
+            # No more free column, recreate the file with more columns
+            logger.debug("Grow the history file {} to {} columns".format(self.path, self._capacity * 2))
+            self.__create(self._capacity * 2, self._header_size, self.__dump())
+        index = self._index[key] = self._free.pop(0)
+        self.__write(index, [])
+        column = self._series[key] = [self._columns[index], True, 0]
+        return column
+
+    def _new_series(self, key):
+        self.__new_column(key)
+        self.__write_table()
+        # The file may have been recreated by __write_table
+        return self._series[key]
+
+    def _del_series(self, key):
+        del self._series[key]
+        self._free.append(self._index.pop(key))
+        self.__write_table()
+
+    def _update_series(self, key):
+        self.__write_table()
+
+    def close(self):
+        """Close the history file."""
+        with self._lock:
+            if self._file is not None:
+                self._mmap.flush()
+                self.__close()
 
 
 class GlancesHistory(object):
 
-    """This class manage a dict of GlancesAttribute
+    """This class manage the history of a plugin
     - key: stats name
-    - value: GlancesAttribute"""
+    - value: list of (date, value)
 
-    def __init__(self):
+    Data are stored in the shared columnar history store (or in the plugin
+    history file if history_path is set in the configuration file)."""
+
+    def __init__(self, plugin_name=None, store=None):
         """
-        items_history_list: list of stats to historized (define inside plugins)
+        plugin_name: name of the plugin (namespace of the series)
+        store: history store (default is the shared one)
         """
-        self.stats_history = {}
+        self.plugin_name = plugin_name
+        self.store = history_store if store is None else store
+        _stores.add(self.store)
 
     def add(self, key, value,
             description='',
             history_max_size=None):
         """Add an new item (key, value) to the current history."""
-        if key not in self.stats_history:
-            self.stats_history[key] = GlancesAttribute(key,
-                                                       description=description,
-                                                       history_max_size=history_max_size)
-        self.stats_history[key].value = value
+        self.store.set_max_size(history_max_size)
+        self.store.add((self.plugin_name, key), value)
 
     def reset(self):
         """Reset all the stats history"""
-        for a in self.stats_history:
-            self.stats_history[a].history_reset()
+        for key in self.__keys():
+            self.store.remove((self.plugin_name, key))
+
+    def __keys(self):
+        """Return the stats names of the plugin."""
+        return [k for p, k in self.store.keys() if p == self.plugin_name]
+
+    def get(self, nb=0, span=None):
+        """Get the history as a dict of list
 
-    def get(self):
-        """Get the history as a dict of list"""
-        return {i: self.stats_history[i].history for i in self.stats_history}
+        If span is set, only the last span seconds are returned (from the
+        downsampled history if needed)."""
+        return dict((k, self.store.get((self.plugin_name, k), nb=nb, span=span))
+                    for k in self.__keys())
 
-    def get_json(self, nb=0):
+    def get_json(self, nb=0, span=None):
         """Get the history as a dict of list (with list JSON compliant)"""
-        return {i: self.stats_history[i].history_json(nb=nb) for i in self.stats_history}
+        return dict((k, self.store.get((self.plugin_name, k), nb=nb, json=True, span=span))
+                    for k in self.__keys())
@@ -3,6 +3,7 @@
 
 """Manage logs."""
 
+import threading
 import time
 from datetime import datetime
 
@@ -39,6 +40,9 @@ class GlancesLogs(object):
         # Init the logs list
         self.logs_list = []
 
+        # Logs are added by plugins updated in parallel
+        self._lock = threading.Lock()
+
     def get(self):
         """Return the raw logs list."""
         return self.logs_list
@@ -96,18 +100,19 @@ class GlancesLogs(object):
         """
         proc_list = proc_list or gl_processes.getalllist()
 
-        # Add or update the log
-        item_index = self.__itemexist__(item_type)
-        if item_index < 0:
-            # Item did not exist, add if WARNING or CRITICAL
-            self._create_item(item_state, item_type, item_value,
-                              proc_list, proc_desc, peak_time)
-        else:
-            # Item exist, update
-            self._update_item(item_index, item_state, item_type, item_value,
-                              proc_list, proc_desc, peak_time)
+        with self._lock:
+            # Add or update the log
+            item_index = self.__itemexist__(item_type)
+            if item_index < 0:
+                # Item did not exist, add if WARNING or CRITICAL
+                self._create_item(item_state, item_type, item_value,
+                                  proc_list, proc_desc, peak_time)
+            else:
+                # Item exist, update
+                self._update_item(item_index, item_state, item_type, item_value,
+                                  proc_list, proc_desc, peak_time)
 
-        return self.len()
+            return self.len()
 
     def _create_item(self, item_state, item_type, item_value,
                      proc_list, proc_desc, peak_time):
@@ -178,8 +183,10 @@ class GlancesLogs(object):
 
             # TOP PROCESS LIST (only for CRITICAL ALERT)
             if item_state == "CRITICAL":
-                # Sort the current process list to retreive the TOP 3 processes
-                self.logs_list[item_index][9] = sort_stats(proc_list, gl_processes.sort_key)[0:3]
+                # Select the TOP 3 processes of the current process list
+                # (copied: the log keeps the stats of the alert time)
+                self.logs_list[item_index][9] = [dict(p) for p in sort_stats(proc_list, gl_processes.sort_key,
+                                                                             limit=3)]
                 self.logs_list[item_index][11] = gl_processes.sort_key
 
             # MONITORED PROCESSES DESC
@@ -193,14 +200,15 @@ class GlancesLogs(object):
         By default, only delete WARNING message.
         If critical = True, also delete CRITICAL message.
         """
-        # Create a new clean list
-        clean_logs_list = []
-        while self.len() > 0:
-            item = self.logs_list.pop()
-            if item[1] < 0 or (not critical and item[2].startswith("CRITICAL")):
-                clean_logs_list.insert(0, item)
-        # The list is now the clean one
-        self.logs_list = clean_logs_list
-        return self.len()
+        with self._lock:
+            # Create a new clean list
+            clean_logs_list = []
+            while self.len() > 0:
+                item = self.logs_list.pop()
+                if item[1] < 0 or (not critical and item[2].startswith("CRITICAL")):
+                    clean_logs_list.insert(0, item)
+            # The list is now the clean one
+            self.logs_list = clean_logs_list
+            return self.len()
 
 glances_logs = GlancesLogs()
@@ -21,6 +21,9 @@ class GlMain(object):
     # Default stats' refresh time is 3 seconds
     refresh_time = 3
 
+    # Default server TCP port
+    server_port = 61208
+
     # Set the default cache lifetime to 1 second (only for server)
     # !!! Todo: To be configurable (=> https://github.com/nicolargo/glances/issues/901)
     cached_time = 1
@@ -35,6 +38,9 @@ Monitor local machine:\n\
 \n\
 Monitor local machine and export stats to a CSV file:\n\
   $ gl --export-csv\n\
+\n\
+Run the JSON/HTTP API server:\n\
+  $ gl -s\n\
     "
 
     def __init__(self):
@@ -115,22 +121,35 @@ Monitor local machine and export stats to a CSV file:\n\
                             dest='export_graph', help='export stats to graphs')
         parser.add_argument('--path-graph', default=tempfile.gettempdir(),
                             dest='path_graph', help='set the export path for graphs (default is {0})'.format(tempfile.gettempdir()))
+        parser.add_argument('--graph-span', default=None, type=int,
+                            dest='graph_span', help='set the time span of the graphs in seconds (default is the whole history)')
         parser.add_argument('--export-csv', default=None,
                             dest='export_csv', help='export stats to a CSV file')
+        parser.add_argument('--export-parquet', default=None,
+                            dest='export_parquet', help='export stats to Parquet files (pyarrow lib needed)')
         parser.add_argument('--export-influxdb', action='store_true', default=False,
                             dest='export_influxdb', help='export stats to an InfluxDB server (influxdb lib needed)')
         parser.add_argument('--export-cassandra', action='store_true', default=False,
                             dest='export_cassandra', help='export stats to a Cassandra or Scylla server (cassandra lib needed)')
         parser.add_argument('--export-opentsdb', action='store_true', default=False,
-                            dest='export_opentsdb', help='export stats to an OpenTSDB server (potsdb lib needed)')
+                            dest='export_opentsdb', help='export stats to an OpenTSDB server')
         parser.add_argument('--export-statsd', action='store_true', default=False,
                             dest='export_statsd', help='export stats to a StatsD server (statsd lib needed)')
         parser.add_argument('--export-elasticsearch', action='store_true', default=False,
                             dest='export_elasticsearch', help='export stats to an ElasticSearch server (elasticsearch lib needed)')
         parser.add_argument('--export-rabbitmq', action='store_true', default=False,
                             dest='export_rabbitmq', help='export stats to rabbitmq broker (pika lib needed)')
+        parser.add_argument('--export-prometheus', action='store_true', default=False,
+                            dest='export_prometheus', help='export stats to a Prometheus server (/metrics page)')
         parser.add_argument('--export-riemann', action='store_true', default=False,
                             dest='export_riemann', help='export stats to riemann broker (bernhard lib needed)')
+        # Server option
+        parser.add_argument('-s', '--server', action='store_true', default=False,
+                            dest='server', help='run Glances in server mode (JSON/HTTP API, Python 3.5+)')
+        parser.add_argument('-B', '--bind', default='0.0.0.0', dest='bind_address',
+                            help='bind server to the given IPv4/IPv6 address or hostname')
+        parser.add_argument('-p', '--port', default=self.server_port, type=int, dest='port',
+                            help='define the server TCP port [default: {}]'.format(self.server_port))
         # Display options
         parser.add_argument('-q', '--quiet', default=False, action='store_true',
                             dest='quiet', help='do not display the curses interface')
@@ -143,6 +162,8 @@ Monitor local machine and export stats to a CSV file:\n\
         parser.add_argument('--hide-kernel-threads', action='store_true', default=False,
                             dest='no_kernel_threads', help='hide kernel threads in process list')
         if LINUX:
+            parser.add_argument('--enable-process-scanner', action='store_true', default=False,
+                                dest='enable_process_scanner', help='read the processes stats directly from /proc')
             parser.add_argument('--tree', action='store_true', default=False,
                                 dest='process_tree', help='display processes as a tree')
         parser.add_argument('-b', '--byte', action='store_true', default=False,
@@ -206,6 +227,13 @@ Monitor local machine and export stats to a CSV file:\n\
         # Control parameter and exit if it is not OK
         self.args = args
 
+        # Server mode needs asyncio (and does not display the curses interface)
+        if args.server:
+            if sys.version_info < (3, 5):
+                logger.critical("Server mode needs Python 3.5 or higher")
+                sys.exit(2)
+            args.quiet = True
+
 
         # Check graph output path
         if args.export_graph and args.path_graph is not None:
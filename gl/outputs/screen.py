@@ -97,7 +97,7 @@ class Screen(object):
             logger.info('Export graphs function enabled with output path %s' %
                         self.args.path_graph)
             from gl.exports.graph import GlancesGraph
-            self.glances_graph = GlancesGraph(self.args.path_graph)
+            self.glances_graph = GlancesGraph(self.args.path_graph, span=self.args.graph_span)
             if not self.glances_graph.graph_enabled():
                 self.args.export_graph = False
                 logger.error('Export graphs disabled')
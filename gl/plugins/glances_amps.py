@@ -28,6 +28,11 @@ class Plugin(GlancesPlugin):
         # Init stats
         self.reset()
 
+    def get_dependencies(self):
+        """Return the list of plugins to update before this one."""
+        # AMPs use the processes list updated by the processcount plugin
+        return ['processcount']
+
     def reset(self):
         """Reset/init the stats."""
         self.stats = []
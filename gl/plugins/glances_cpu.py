@@ -63,9 +63,6 @@ class Plugin(GlancesPlugin):
         # Grab stats into self.stats
         self.update_local()
 
-        # Update the history list
-        self.update_stats_history()
-
         # Update the view
         self.update_views()
 
@@ -13,6 +13,9 @@ class Plugin(GlancesPlugin):
 
     """Glances folder plugin."""
 
+    # Default refresh time in seconds
+    _default_refresh = 60
+
     def __init__(self, args=None):
         """Init the plugin."""
         super(Plugin, self).__init__(args=args)
@@ -35,6 +38,8 @@ class Plugin(GlancesPlugin):
     def load_limits(self, config):
         """Load the foldered list from the config file, if it exists."""
         self.glances_folders = glancesFolderList(config)
+        # Load the plugin configuration (refresh time)
+        return super(Plugin, self).load_limits(config)
 
     def update(self):
         """Update the foldered list."""
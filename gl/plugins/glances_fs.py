@@ -24,6 +24,9 @@ class Plugin(GlancesPlugin):
     stats is a list
     """
 
+    # Default refresh time in seconds
+    _default_refresh = 15
+
     def __init__(self, args=None):
         """Init the plugin."""
         super(Plugin, self).__init__(args=args, items_history_list=items_history_list)
@@ -90,9 +93,6 @@ class Plugin(GlancesPlugin):
                 'key': self.get_key()}
             self.stats.append(fs_current)
 
-        # Update the history list
-        self.update_stats_history('mnt_point')
-
         # Update the view
         self.update_views()
 
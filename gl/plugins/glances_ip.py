@@ -36,6 +36,9 @@ class Plugin(GlancesPlugin):
     stats is a dict
     """
 
+    # Default refresh time in seconds
+    _default_refresh = 60
+
     def __init__(self, args=None):
         """Init the plugin."""
         super(Plugin, self).__init__(args=args)
@@ -68,9 +68,6 @@ class Plugin(GlancesPlugin):
                           'min15': load[2],
                           'cpucore': self.nb_log_core}
 
-        # Update the history list
-        self.update_stats_history()
-
         # Update the view
         self.update_views()
 
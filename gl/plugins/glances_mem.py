@@ -78,9 +78,6 @@ class Plugin(GlancesPlugin):
         # used=total-free
         self.stats['used'] = self.stats['total'] - self.stats['free']
 
-        # Update the history list
-        self.update_stats_history()
-
         # Update the view
         self.update_views()
 
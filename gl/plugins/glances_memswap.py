@@ -61,9 +61,6 @@ class Plugin(GlancesPlugin):
             if hasattr(sm_stats, swap):
                 self.stats[swap] = getattr(sm_stats, swap)
 
-        # Update the history list
-        self.update_stats_history()
-
         # Update the view
         self.update_views()
 
@@ -124,9 +124,6 @@ class Plugin(GlancesPlugin):
             self.network_old = network_new
 
 
-        # Update the history list
-        self.update_stats_history(self.get_key())
-
         # Update the view
         self.update_views()
 
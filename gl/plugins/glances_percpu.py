@@ -29,6 +29,11 @@ class Plugin(GlancesPlugin):
         """Return the key of the list."""
         return 'cpu_number'
 
+    def get_dependencies(self):
+        """Return the list of plugins to update before this one."""
+        # The per-CPU stats share the cpu_percent instance with the CPU plugin
+        return ['cpu']
+
     def reset(self):
         """Reset/init the stats."""
         self.stats = []
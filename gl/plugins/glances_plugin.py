@@ -6,21 +6,31 @@ I am your father...
 ...for all Glances plugins.
 """
 
+import os
 import re
 import json
 from operator import itemgetter
 
 from gl.compat import iterkeys, itervalues, listkeys, map
 from gl.actions import GlancesActions
-from gl.history import GlancesHistory
+from gl.history import GlancesHistory, GlancesMmapHistoryStore
 from gl.logger import logger
 from gl.logs import glances_logs
+from gl.snapshot import freeze_stats
+from gl.timer import Timer
 
 
 class GlancesPlugin(object):
 
     """Main class for Glances plugin."""
 
+    # Default refresh time in seconds (0: refresh at each Glances refresh)
+    _default_refresh = 0
+
+    # Attributes set by the display (msg_curse) of the stats snapshot
+    # (the frozen plugins are read-only, except these attributes)
+    display_attributes = ()
+
     def __init__(self, args=None, items_history_list=None):
         """Init the plugin of plugins class."""
         # Plugin name (= module name without glances_)
@@ -53,6 +63,9 @@ class GlancesPlugin(object):
         # Init the views
         self.views = dict()
 
+        # Init the refresh timer
+        self.refresh_timer = Timer(0)
+
     def exit(self):
         """Method to be called when Glances exit"""
         logger.debug("Stop the {} plugin".format(self.plugin_name))
@@ -69,6 +82,35 @@ class GlancesPlugin(object):
         """Return the key of the list."""
         return None
 
+    def get_dependencies(self):
+        """Return the list of plugins to update before this one."""
+        return []
+
+    def get_refresh(self):
+        """Return the refresh time (in seconds) of the plugin.
+
+        Defined by the 'refresh' key of the plugin section in the
+        configuration file, or by the plugin default refresh time.
+        """
+        try:
+            return float(self._limits[self.plugin_name + '_refresh'])
+        except (KeyError, TypeError, ValueError):
+            return self._default_refresh
+
+    def is_refresh_needed(self):
+        """Return True if the stats should be refreshed, False instead.
+
+        Between two refreshes, the plugin keeps its cached stats.
+        The timer is restarted by reset_refresh_timer, once the update is
+        actually started.
+        """
+        return self.refresh_timer.finished()
+
+    def reset_refresh_timer(self):
+        """Restart the refresh timer (the plugin update is started)."""
+        self.refresh_timer.set(self.get_refresh())
+        self.refresh_timer.reset()
+
     def _json_dumps(self, d):
         """Return the object 'd' in a JSON format
         Manage the issue #815 for Windows OS"""
@@ -80,29 +122,45 @@ class GlancesPlugin(object):
     def _history_enable(self):
         return self.args is not None and not self.args.disable_history and self.get_items_history_list() is not None
 
-    def init_stats_history(self):
-        """Init the stats history (dict of GlancesAttribute)."""
+    def init_stats_history(self, history_path=None):
+        """Init the stats history.
+
+        If history_path is set, the history is stored in the
+        <history_path>/<plugin>.history file, else in the shared history store.
+        """
+        store = None
         if self._history_enable():
             init_list = [a['name'] for a in self.get_items_history_list()]
             logger.debug("Stats history activated for plugin {0} (items: {1})".format(self.plugin_name, init_list))
-        return GlancesHistory()
+            if history_path is not None:
+                try:
+                    store = GlancesMmapHistoryStore(os.path.join(history_path, self.plugin_name + '.history'),
+                                                    max_size=self._limits['history_size'])
+                except (IOError, OSError) as e:
+                    logger.error("Cannot open history file for plugin {0} ({1})".format(self.plugin_name, e))
+        return GlancesHistory(self.plugin_name, store=store)
 
     def reset_stats_history(self):
-        """Reset the stats history (dict of GlancesAttribute)."""
+        """Reset the stats history."""
         if self._history_enable():
             reset_list = [a['name'] for a in self.get_items_history_list()]
             logger.debug("Reset history for plugin {0} (items: {1})".format(self.plugin_name, reset_list))
             self.stats_history.reset()
 
-    def update_stats_history(self, item_name=''):
-        """Update stats history."""
-        if self.stats and self._history_enable():
+    def update_stats_history(self, item_name='', stats=None):
+        """Update stats history.
+
+        Use the given stats (the stats snapshot) or the plugin stats.
+        """
+        if stats is None:
+            stats = self.stats
+        if stats and self._history_enable():
             for i in self.get_items_history_list():
-                if isinstance(self.stats, list):
+                if isinstance(stats, list):
                     # Stats is a list of data
                     # Iter throught it (for exemple, iter throught network
                     # interface)
-                    for l in self.stats:
+                    for l in stats:
                         self.stats_history.add(
                             l[item_name] + '_' + i['name'],
                             l[i['name']],
@@ -112,7 +170,7 @@ class GlancesPlugin(object):
                     # Stats is not a list
                     # Add the item to the history directly
                     self.stats_history.add(i['name'],
-                                           self.stats[i['name']],
+                                           stats[i['name']],
                                            description=i['description'],
                                            history_max_size=self._limits['history_size'])
 
@@ -120,12 +178,13 @@ class GlancesPlugin(object):
         """Return the items history list."""
         return self.items_history_list
 
-    def get_raw_history(self, item=None):
+    def get_raw_history(self, item=None, span=None):
         """Return
         - the stats history (dict of list) if item is None
         - the stats history for the given item (list) instead
-        - None if item did not exist in the history"""
-        s = self.stats_history.get()
+        - None if item did not exist in the history
+        Limit to the lasts span seconds if span is set"""
+        s = self.stats_history.get(span=span)
         if item is None:
             return s
         else:
@@ -134,13 +193,14 @@ class GlancesPlugin(object):
             else:
                 return None
 
-    def get_json_history(self, item=None, nb=0):
+    def get_json_history(self, item=None, nb=0, span=None):
         """Return:
         - the stats history (dict of list) if item is None
         - the stats history for the given item (list) instead
         - None if item did not exist in the history
-        Limit to lasts nb items (all if nb=0)"""
-        s = self.stats_history.get_json(nb=nb)
+        Limit to lasts nb items (all if nb=0) or to the lasts span seconds.
+        The downsampled history is used if the raw one is too short."""
+        s = self.stats_history.get_json(nb=nb, span=span)
         if item is None:
             return s
         else:
@@ -149,10 +209,10 @@ class GlancesPlugin(object):
             else:
                 return None
 
-    def get_export_history(self, item=None):
+    def get_export_history(self, item=None, span=None):
         """Return the stats history object to export.
         See get_raw_history for a full description"""
-        return self.get_raw_history(item=item)
+        return self.get_raw_history(item=item, span=span)
 
     def get_stats_history(self, item=None, nb=0):
         """Return the stats history as a JSON object (dict or None).
@@ -172,7 +232,7 @@ class GlancesPlugin(object):
             try:
                 # Source:
                 # http://stackoverflow.com/questions/4573875/python-get-index-of-dictionary-item-in-list
-                return self._json_dumps({item: map(itemgetter(item), s)})
+                return self._json_dumps({item: list(map(itemgetter(item), s))})
             except (KeyError, ValueError) as e:
                 logger.error("Cannot get item history {0} ({1})".format(item, e))
                 return None
@@ -216,6 +276,13 @@ class GlancesPlugin(object):
         """Return the stats object to export."""
         return self.get_raw()
 
+    def get_stats_snapshot(self, stats=None, memo=None):
+        """Return a copy of the stats (or of the given stats) for the stats snapshot.
+
+        memo is shared by the copies of a snapshot (see freeze_stats).
+        """
+        return freeze_stats(self.stats if stats is None else stats, memo)
+
     def get_stats(self):
         """Return the stats object in JSON format."""
         return self._json_dumps(self.stats)
@@ -235,7 +302,7 @@ class GlancesPlugin(object):
             try:
                 # Source:
                 # http://stackoverflow.com/questions/4573875/python-get-index-of-dictionary-item-in-list
-                return self._json_dumps({item: map(itemgetter(item), self.stats)})
+                return self._json_dumps({item: list(map(itemgetter(item), self.stats))})
             except (KeyError, ValueError) as e:
                 logger.error("Cannot get item {} ({})".format(item, e))
                 return None
@@ -336,6 +403,17 @@ class GlancesPlugin(object):
         if config.has_section('global'):
             self._limits['history_size'] = config.get_float_value('global', 'history_size', default=28800)
             logger.debug("Load configuration key: {0} = {1}".format('history_size', self._limits['history_size']))
+            history_path = config.get_value('global', 'history_path')
+            if history_path is not None:
+                # Store the history in memory mapped files
+                self.stats_history = self.init_stats_history(os.path.expanduser(history_path))
+            # Downsampled history (period:size list)
+            rollups = config.get_value('global', 'history_rollups', default='60:1440,600:4320')
+            try:
+                rollups = [r.split(':') for r in rollups.split(',') if r.strip()]
+                self.stats_history.store.set_rollups(rollups)
+            except ValueError as e:
+                logger.error("Cannot parse the history_rollups configuration key ({0})".format(e))
 
         # Read the plugin specific section
         if config.has_section(self.plugin_name):
@@ -3,6 +3,7 @@
 
 """Process list plugin."""
 
+import copy
 import os
 from datetime import timedelta
 
@@ -10,8 +11,10 @@ from gl.compat import iteritems
 from gl.globals import LINUX
 from gl.logger import logger
 from gl.processes import gl_processes, sort_stats
+from gl.processes_tree import ProcessTreeNode
 from gl.plugins.glances_core import Plugin as CorePlugin
 from gl.plugins.glances_plugin import GlancesPlugin
+from gl.snapshot import freeze_stats
 
 
 def convert_timedelta(delta):
@@ -47,6 +50,9 @@ class Plugin(GlancesPlugin):
     stats is a list
     """
 
+    # Display state (see the msg_curse method)
+    display_attributes = ('tag_proc_time', 'mmm_min', 'mmm_max')
+
     def __init__(self, args=None):
         """Init the plugin."""
         super(Plugin, self).__init__(args=args)
@@ -69,6 +75,11 @@ class Plugin(GlancesPlugin):
         """Return the key of the list."""
         return 'pid'
 
+    def get_dependencies(self):
+        """Return the list of plugins to update before this one."""
+        # Processes are updated by the processcount plugin
+        return ['processcount']
+
     def reset(self):
         """Reset/init the stats."""
         self.stats = []
@@ -92,6 +103,26 @@ class Plugin(GlancesPlugin):
 
         return self.stats
 
+    def get_stats_snapshot(self, stats=None, memo=None):
+        """Return a copy of the stats for the stats snapshot.
+
+        The nodes of the tree are copied, not their psutil processes.
+        """
+        if stats is None:
+            stats = self.stats
+        if not isinstance(stats, ProcessTreeNode):
+            return super(Plugin, self).get_stats_snapshot(stats, memo)
+        if memo is None:
+            memo = {}
+        root = copy.copy(stats)
+        nodes = [root]
+        while nodes:
+            node = nodes.pop()
+            node.stats = freeze_stats(node.stats, memo)
+            node.children = [copy.copy(child) for child in node.children]
+            nodes.extend(node.children)
+        return root
+
     def get_process_tree_curses_data(self, node, args, first_level=True, max_node_count=None):
         """Get curses data to display for a process tree."""
         ret = []
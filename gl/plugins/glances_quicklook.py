@@ -38,6 +38,11 @@ class Plugin(GlancesPlugin):
         # Init stats
         self.reset()
 
+    def get_dependencies(self):
+        """Return the list of plugins to update before this one."""
+        # Reuse the CPU percent computed by the CPU and per-CPU plugins
+        return ['cpu', 'percpu']
+
     def reset(self):
         """Reset/init the stats."""
         self.stats = {}
@@ -21,6 +21,9 @@ class Plugin(GlancesPlugin):
     stats is a dict (see pymdstat documentation)
     """
 
+    # Default refresh time in seconds
+    _default_refresh = 15
+
     def __init__(self, args=None):
         """Init the plugin."""
         super(Plugin, self).__init__(args=args)
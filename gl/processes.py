@@ -1,16 +1,23 @@
 # -*- coding: utf-8 -*-
 
+import heapq
 import operator
 import os
+import threading
 
 from gl.compat import iteritems, itervalues, listitems
-from gl.timer import Timer, getTimeSinceLastUpdate
+from gl.timer import getTimeSinceLastUpdate
 from gl.processes_tree import ProcessTreeNode
+from gl.processes_scanner import ProcessScanner
 from gl.filter import GlancesFilter
 from gl.logger import logger
 
 import psutil
 
+# The cached command lines are read again every CMDLINE_REFRESH cycles
+# (a process can exec another program without changing its pid)
+CMDLINE_REFRESH = 60
+
 
 def is_kernel_thread(proc):
     """Return True if proc is a kernel thread, False instead."""
@@ -22,26 +29,80 @@ def is_kernel_thread(proc):
         return False
 
 
+class ProcessEntry(object):
+
+    """An entry of the processes table.
+
+    stats: the process stats dict (a new dict each cycle: the lists of
+    the previous cycles, kept by the logs, are not modified)
+    cmdline, username: cached because PSUtil do not cache all the stats
+    (see: https://code.google.com/p/psutil/issues/detail?id=462)
+    cmdline_cycle: cycle of the last cmdline read
+    io_old: [read_bytes_old, write_bytes_old] for the IO rate computation
+    """
+
+    __slots__ = ('stats', 'cmdline', 'cmdline_cycle', 'username', 'io_old', 'cycle')
+
+    def __init__(self, pid):
+        self.stats = {'pid': pid}
+        self.cmdline = None
+        self.cmdline_cycle = 0
+        self.username = None
+        self.io_old = None
+        self.cycle = 0
+
+
+class ProcessTable(object):
+
+    """Persistent table of the processes.
+
+    key = (pid, create_time), so a recycled pid is a new process
+    value = ProcessEntry
+
+    Entries are only allocated for new processes and dropped when the
+    process exits (see the clean method).
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._cycle = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def new_cycle(self):
+        """Start a new update cycle."""
+        self._cycle += 1
+
+    def get(self, proc):
+        """Return the entry of the process proc (None if the process is dead)."""
+        try:
+            key = (proc.pid, proc.create_time())
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+        try:
+            entry = self._entries[key]
+        except KeyError:
+            entry = self._entries[key] = ProcessEntry(proc.pid)
+        entry.cycle = self._cycle
+        return entry
+
+    def clean(self):
+        """Drop the processes not seen during the current cycle."""
+        for key in [k for k, e in iteritems(self._entries) if e.cycle != self._cycle]:
+            del self._entries[key]
+
+
 class Processes(object):
 
     """Get processed stats using the psutil library."""
 
-    def __init__(self, cache_timeout=60):
+    def __init__(self):
         """Init the class to collect stats about processes."""
-        # Add internals caches because PSUtil do not cache all the stats
-        # See: https://code.google.com/p/psutil/issues/detail?id=462
         logger.debug("[GlancesProcesses.__init__]")
-        self.username_cache = {}
-        self.cmdline_cache = {}
 
-        # The internals caches will be cleaned each 'cache_timeout' seconds
-        self.cache_timeout = cache_timeout
-        self.cache_timer = Timer(self.cache_timeout)
-
-        # Init the io dict
-        # key = pid
-        # value = [ read_bytes_old, write_bytes_old ]
-        self.io_old = {}
+        # Persistent processes table (replace the internals caches)
+        self._table = ProcessTable()
 
         # Wether or not to enable process tree
         self._enable_tree = False
@@ -53,6 +114,8 @@ class Processes(object):
         self.allprocesslist = []
         self.processlist = []
         self.processcount = {'total': 0, 'running': 0, 'sleeping': 0, 'thread': 0}
+        # Lock of the stats publication (see the update method)
+        self._lock = threading.Lock()
 
         # Tag to enable/disable the processes stats (to reduce the Glances CPU consumption)
         # Default is to enable the processes stats
@@ -70,6 +133,9 @@ class Processes(object):
         # Whether or not to hide kernel threads
         self.no_kernel_threads = False
 
+        # Linux native processes scanner (None to use psutil.process_iter)
+        self._scanner = None
+
     def enable(self):
         """Enable process stats."""
         self.disable_tag = False
@@ -127,6 +193,17 @@ class Processes(object):
         """Ignore kernel threads in process list."""
         self.no_kernel_threads = True
 
+    def enable_scanner(self):
+        """Read the processes stats directly from /proc (Linux only)."""
+        if ProcessScanner.is_available():
+            self._scanner = ProcessScanner()
+        else:
+            logger.warning("Processes scanner not available, fallback to psutil")
+
+    def is_scanner_enabled(self):
+        """Return True if the processes scanner is enabled, False instead."""
+        return self._scanner is not None
+
     def enable_tree(self):
         """Enable process tree."""
         self._enable_tree = True
@@ -143,19 +220,22 @@ class Processes(object):
 
         return True
 
-    def __get_mandatory_stats(self, proc, procstat):
+    def __get_mandatory_stats(self, proc, entry):
         """
         Get mandatory_stats: need for the sorting/filter step.
 
         => cpu_percent, memory_percent, io_counters, name, cmdline
         """
+        procstat = entry.stats
         procstat['mandatory_stats'] = True
 
         # Process CPU, MEM percent and name
+        # (and parent pid to build the process tree)
+        attrs = ['username', 'cpu_percent', 'memory_percent', 'name', 'cpu_times']
+        if self._enable_tree:
+            attrs.append('ppid')
         try:
-            procstat.update(proc.as_dict(
-                attrs=['username', 'cpu_percent', 'memory_percent',
-                       'name', 'cpu_times'], ad_value=''))
+            procstat.update(proc.as_dict(attrs=attrs, ad_value=''))
         except psutil.NoSuchProcess:
             # Try/catch for issue #432
             return None
@@ -164,16 +244,16 @@ class Processes(object):
             # cpu_percent or memory_percent stats
             return None
 
-        # Process command line (cached with internal cache)
-        try:
-            self.cmdline_cache[procstat['pid']]
-        except KeyError:
+        # Process command line (cached in the processes table)
+        # Read again if empty (not yet available after a fork) or too old
+        if not entry.cmdline or entry.cycle - entry.cmdline_cycle >= CMDLINE_REFRESH:
+            entry.cmdline_cycle = entry.cycle
             # Patch for issue #391
             try:
-                self.cmdline_cache[procstat['pid']] = proc.cmdline()
+                entry.cmdline = proc.cmdline()
             except (AttributeError, UnicodeDecodeError, psutil.AccessDenied, psutil.NoSuchProcess):
-                self.cmdline_cache[procstat['pid']] = ""
-        procstat['cmdline'] = self.cmdline_cache[procstat['pid']]
+                entry.cmdline = ""
+        procstat['cmdline'] = entry.cmdline
 
         # Process IO
         # procstat['io_counters'] is a list:
@@ -195,13 +275,9 @@ class Processes(object):
         else:
             # For IO rate computation
             # Append saved IO r/w bytes
-            try:
-                procstat['io_counters'] = io_new + \
-                    self.io_old[procstat['pid']]
-            except KeyError:
-                procstat['io_counters'] = io_new + [0, 0]
+            procstat['io_counters'] = io_new + (entry.io_old or [0, 0])
             # then save the IO r/w bytes
-            self.io_old[procstat['pid']] = io_new
+            entry.io_old = io_new
             io_tag = 1
 
         # Append the IO tag (for display)
@@ -209,28 +285,27 @@ class Processes(object):
 
         return procstat
 
-    def __get_standard_stats(self, proc, procstat):
+    def __get_standard_stats(self, proc, entry):
         """
         Get standard_stats: for all the displayed processes.
 
         => username, status, memory_info, cpu_times
         """
+        procstat = entry.stats
         procstat['standard_stats'] = True
 
-        # Process username (cached with internal cache)
-        try:
-            self.username_cache[procstat['pid']]
-        except KeyError:
+        # Process username (cached in the processes table)
+        if entry.username is None:
             try:
-                self.username_cache[procstat['pid']] = proc.username()
+                entry.username = proc.username()
             except psutil.NoSuchProcess:
-                self.username_cache[procstat['pid']] = "?"
+                entry.username = "?"
             except (KeyError, psutil.AccessDenied):
                 try:
-                    self.username_cache[procstat['pid']] = proc.uids().real
+                    entry.username = proc.uids().real
                 except (KeyError, AttributeError, psutil.AccessDenied):
-                    self.username_cache[procstat['pid']] = "?"
-        procstat['username'] = self.username_cache[procstat['pid']]
+                    entry.username = "?"
+        procstat['username'] = entry.username
 
         # Process status, nice, memory_info and cpu_times
         try:
@@ -243,12 +318,13 @@ class Processes(object):
 
         return procstat
 
-    def __get_extended_stats(self, proc, procstat):
+    def __get_extended_stats(self, proc, entry):
         """
         Get extended_stats: only for top processes (see issue #403).
 
         => connections (UDP/TCP), memory_swap...
         """
+        procstat = entry.stats
         procstat['extended_stats'] = True
 
         # CPU affinity (Windows and Linux only)
@@ -297,16 +373,19 @@ class Processes(object):
 
         # SWAP memory (Only on Linux based OS)
         # http://www.cyberciti.biz/faq/linux-which-process-is-using-swap/
-        try:
-            procstat['memory_swap'] = sum(
-                [v.swap for v in proc.memory_maps()])
-        except psutil.NoSuchProcess:
-            pass
-        except psutil.AccessDenied:
-            procstat['memory_swap'] = None
-        except Exception:
-            # Add a dirty except to handle the PsUtil issue #413
-            procstat['memory_swap'] = None
+        # Already read (VmSwap) if the processes scanner is enabled
+        procstat['memory_swap'] = getattr(proc, 'swap', None)
+        if procstat['memory_swap'] is None:
+            try:
+                procstat['memory_swap'] = sum(
+                    [v.swap for v in proc.memory_maps()])
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.AccessDenied:
+                procstat['memory_swap'] = None
+            except Exception:
+                # Add a dirty except to handle the PsUtil issue #413
+                procstat['memory_swap'] = None
 
         # Process network connections (TCP and UDP)
         try:
@@ -325,33 +404,39 @@ class Processes(object):
 
         return procstat
 
-    def __get_process_stats(self, proc,
+    def __get_process_stats(self, proc, entry,
                             mandatory_stats=True,
                             standard_stats=True,
                             extended_stats=False):
-        """Get stats of running processes."""
-        # Process ID (always)
-        procstat = proc.as_dict(attrs=['pid'])
+        """Get stats of running processes.
+
+        The mandatory stats are read in a new entry.stats dict, the other
+        ones are added to it.
+        """
+        procstat = entry.stats
 
         if mandatory_stats:
-            procstat = self.__get_mandatory_stats(proc, procstat)
+            # New cycle: new dict, process ID (always)
+            entry.stats = {'pid': proc.pid}
+            procstat = self.__get_mandatory_stats(proc, entry)
 
         if procstat is not None and standard_stats:
-            procstat = self.__get_standard_stats(proc, procstat)
+            procstat = self.__get_standard_stats(proc, entry)
 
         if procstat is not None and extended_stats and not self.disable_extended_tag:
-            procstat = self.__get_extended_stats(proc, procstat)
+            procstat = self.__get_extended_stats(proc, entry)
 
         return procstat
 
     def update(self):
         """Update the processes stats."""
-        # Reset the stats
-        self.processlist = []
-        self.processcount = {'total': 0, 'running': 0, 'sleeping': 0, 'thread': 0}
+        # Stats of the cycle (published at the end, see __publish)
+        processlist = []
+        processcount = {'total': 0, 'running': 0, 'sleeping': 0, 'thread': 0}
 
         # Do not process if disable tag is set
         if self.disable_tag:
+            self.__publish(processlist, processcount, [])
             return
 
         # Get the time since last update
@@ -359,15 +444,25 @@ class Processes(object):
 
         # Build an internal dict with only mandatories stats (sort keys)
         processdict = {}
-        excluded_processes = set()
-        for proc in psutil.process_iter():
+        if self._scanner is not None:
+            # Read /proc/<pid>/stat, statm and status once per process
+            processiter = self._scanner.scan()
+        else:
+            processiter = psutil.process_iter()
+        self._table.new_cycle()
+        for proc in processiter:
             # Ignore kernel threads if needed
             if self.no_kernel_threads and is_kernel_thread(proc):
                 continue
 
+            # Get the process entry (only allocated for new processes)
+            entry = self._table.get(proc)
+            if entry is None:
+                continue
+
             # If self.max_processes is None: Only retrieve mandatory stats
             # Else: retrieve mandatory and standard stats
-            s = self.__get_process_stats(proc,
+            s = self.__get_process_stats(proc, entry,
                                          mandatory_stats=True,
                                          standard_stats=self.max_processes is None)
             # Check if s is note None (issue #879)
@@ -376,49 +471,51 @@ class Processes(object):
                 continue
             # Continue to the next process if it has to be filtered
             if self._filter.is_filtered(s):
-                excluded_processes.add(proc)
                 continue
 
             # Ok add the process to the list
             processdict[proc] = s
             # Update processcount (global statistics)
             try:
-                self.processcount[str(proc.status())] += 1
+                processcount[str(proc.status())] += 1
             except KeyError:
                 # Key did not exist, create it
                 try:
-                    self.processcount[str(proc.status())] = 1
+                    processcount[str(proc.status())] = 1
                 except psutil.NoSuchProcess:
                     pass
             except psutil.NoSuchProcess:
                 pass
             else:
-                self.processcount['total'] += 1
+                processcount['total'] += 1
             # Update thread number (global statistics)
             try:
-                self.processcount['thread'] += proc.num_threads()
+                processcount['thread'] += proc.num_threads()
             except Exception:
                 pass
 
+        # Drop the exited processes from the table
+        self._table.clean()
+
+        process_tree = None
         if self._enable_tree:
-            self.process_tree = ProcessTreeNode.build_tree(processdict,
-                                                           self.sort_key,
-                                                           self.sort_reverse,
-                                                           self.no_kernel_threads,
-                                                           excluded_processes)
+            process_tree = ProcessTreeNode.build_tree(processdict,
+                                                      self.sort_key,
+                                                      self.sort_reverse,
+                                                      self.no_kernel_threads)
 
-            for i, node in enumerate(self.process_tree):
+            for i, node in enumerate(process_tree):
                 # Only retreive stats for visible processes (max_processes)
                 if self.max_processes is not None and i >= self.max_processes:
                     break
 
-                # add standard stats
-                new_stats = self.__get_process_stats(node.process,
-                                                     mandatory_stats=False,
-                                                     standard_stats=True,
-                                                     extended_stats=False)
-                if new_stats is not None:
-                    node.stats.update(new_stats)
+                # add standard stats (updated in place in node.stats)
+                entry = self._table.get(node.process)
+                if entry is not None:
+                    self.__get_process_stats(node.process, entry,
+                                             mandatory_stats=False,
+                                             standard_stats=True,
+                                             extended_stats=False)
 
                 # Add a specific time_since_update stats for bitrate
                 node.stats['time_since_update'] = time_since_update
@@ -427,20 +524,22 @@ class Processes(object):
             # Process optimization
             # Only retreive stats for visible processes (max_processes)
             if self.max_processes is not None:
-                # Sort the internal dict and cut the top N (Return a list of tuple)
+                # Select the top N of the internal dict (Return a list of tuple)
                 # tuple=key (proc), dict (returned by __get_process_stats)
+                # Heap selection: O(n log N) instead of a full sort
+                sort_key = get_sort_key(self.sort_key)
                 try:
-                    processiter = sorted(iteritems(processdict),
-                                         key=lambda x: x[1][self.sort_key],
-                                         reverse=self.sort_reverse)
-                except (KeyError, TypeError) as e:
+                    processloop = nsorted(iteritems(processdict),
+                                          self.max_processes,
+                                          key=lambda x: sort_key(x[1]),
+                                          reverse=self.sort_reverse)
+                except (KeyError, TypeError, IndexError) as e:
                     logger.error("Cannot sort process list by {}: {}".format(self.sort_key, e))
                     logger.error('{}'.format(listitems(processdict)[0]))
                     # Fallback to all process (issue #423)
                     processloop = iteritems(processdict)
                     first = False
                 else:
-                    processloop = processiter[0:self.max_processes]
                     first = True
             else:
                 # Get all processes stats
@@ -451,39 +550,46 @@ class Processes(object):
                 # Already existing mandatory stats
                 procstat = i[1]
                 if self.max_processes is not None:
-                    # Update with standard stats
+                    # Update (in place) with standard stats
                     # and extended stats but only for TOP (first) process
-                    s = self.__get_process_stats(i[0],
-                                                 mandatory_stats=False,
-                                                 standard_stats=True,
-                                                 extended_stats=first)
-                    if s is None:
+                    entry = self._table.get(i[0])
+                    if entry is None:
                         continue
-                    procstat.update(s)
+                    self.__get_process_stats(i[0], entry,
+                                             mandatory_stats=False,
+                                             standard_stats=True,
+                                             extended_stats=first)
                 # Add a specific time_since_update stats for bitrate
                 procstat['time_since_update'] = time_since_update
                 # Update process list
-                self.processlist.append(procstat)
+                processlist.append(procstat)
                 # Next...
                 first = False
 
         # Build the all processes list used by the AMPs
-        self.allprocesslist = [p for p in itervalues(processdict)]
+        self.__publish(processlist, processcount, [p for p in itervalues(processdict)], process_tree)
 
-        # Clean internals caches if timeout is reached
-        if self.cache_timer.finished():
-            self.username_cache = {}
-            self.cmdline_cache = {}
-            # Restart the timer
-            self.cache_timer.reset()
+    def __publish(self, processlist, processcount, allprocesslist, process_tree=None):
+        """Replace the stats by the ones of the cycle (at once).
+
+        Plugins updated in parallel (the alerts logs) read the lists of
+        the last complete cycle, never the ones being built.
+        """
+        with self._lock:
+            self.processlist = processlist
+            self.processcount = processcount
+            self.allprocesslist = allprocesslist
+            if process_tree is not None:
+                self.process_tree = process_tree
 
     def getcount(self):
         """Get the number of processes."""
         return self.processcount
 
     def getalllist(self):
-        """Get the allprocesslist."""
-        return self.allprocesslist
+        """Get the allprocesslist (of the last complete cycle)."""
+        with self._lock:
+            return self.allprocesslist
 
     def getlist(self, sortedby=None):
         """Get the processlist."""
@@ -504,40 +610,61 @@ class Processes(object):
         self._sort_key = key
 
 
+def get_sort_key(sortedby):
+    """Return the key function used to sort the processes stats by sortedby."""
+    if sortedby == 'io_counters':
+        # Specific case for io_counters
+        # Sort process by IO rate (sum IO read + IO write)
+        return lambda process: (process[sortedby][0] - process[sortedby][2] +
+                                process[sortedby][1] - process[sortedby][3])
+    return operator.itemgetter(sortedby)
+
+
+def nsorted(iterable, n, key=None, reverse=False):
+    """Return the n first items of sorted(iterable, key=key, reverse=reverse).
+
+    Heap based selection in O(len(iterable) * log(n)).
+    """
+    if reverse:
+        return heapq.nlargest(n, iterable, key=key)
+    return heapq.nsmallest(n, iterable, key=key)
+
+
 # TODO: move this global function (also used in glances_processlist
 #       and logs) inside the GlancesProcesses class
-def sort_stats(stats, sortedby=None, tree=False, reverse=True):
+def sort_stats(stats, sortedby=None, tree=False, reverse=True, limit=None):
     """Return the stats (dict) sorted by (sortedby)
-    Reverse the sort if reverse is True."""
+    Reverse the sort if reverse is True.
+
+    If limit is set (not for tree), only return the limit first stats:
+    the stats list is not sorted in place but a top-N selection is done."""
     if sortedby is None:
         # No need to sort...
+        return stats if limit is None else stats[:limit]
+
+    if tree:
+        stats.set_sorting(sortedby, reverse)
         return stats
 
-    if sortedby == 'io_counters' and not tree:
-        # Specific case for io_counters
-        # Sum of io_r + io_w
+    if limit is None:
+        def do_sort(key, reverse):
+            stats.sort(key=key, reverse=reverse)
+            return stats
+    else:
+        def do_sort(key, reverse):
+            return nsorted(stats, limit, key=key, reverse=reverse)
+
+    if sortedby == 'io_counters':
         try:
-            # Sort process by IO rate (sum IO read + IO write)
-            stats.sort(key=lambda process: process[sortedby][0] -
-                       process[sortedby][2] + process[sortedby][1] -
-                       process[sortedby][3],
-                       reverse=reverse)
+            return do_sort(get_sort_key(sortedby), reverse)
         except Exception:
-            stats.sort(key=operator.itemgetter('cpu_percent'),
-                       reverse=reverse)
+            return do_sort(operator.itemgetter('cpu_percent'), reverse)
     else:
         # Others sorts
-        if tree:
-            stats.set_sorting(sortedby, reverse)
-        else:
-            try:
-                stats.sort(key=operator.itemgetter(sortedby),
-                           reverse=reverse)
-            except (KeyError, TypeError):
-                stats.sort(key=operator.itemgetter('name'),
-                           reverse=False)
-
-    return stats
+        try:
+            return do_sort(get_sort_key(sortedby), reverse)
+        except (KeyError, TypeError):
+            return do_sort(operator.itemgetter('name'), False)
 
 
 gl_processes = Processes()
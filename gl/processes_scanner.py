@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+
+"""Linux native processes scanner (read the stats directly from /proc)."""
+
+import collections
+import os
+import pwd
+from time import time
+
+from gl.compat import nativestr
+from gl.globals import LINUX
+
+import psutil
+
+# Same fields as the psutil Linux named tuples
+pcputimes = collections.namedtuple('pcputimes', ['user', 'system', 'children_user', 'children_system'])
+pmem = collections.namedtuple('pmem', ['rss', 'vms', 'shared', 'text', 'lib', 'data', 'dirty'])
+pio = collections.namedtuple('pio', ['read_count', 'write_count', 'read_bytes', 'write_bytes'])
+puids = collections.namedtuple('puids', ['real', 'effective', 'saved'])
+pctxsw = collections.namedtuple('pctxsw', ['voluntary', 'involuntary'])
+
+# Process state (/proc/<pid>/stat) to psutil status
+PROC_STATUSES = {
+    'R': 'running',
+    'S': 'sleeping',
+    'D': 'disk-sleep',
+    'T': 'stopped',
+    't': 'tracing-stop',
+    'Z': 'zombie',
+    'X': 'dead',
+    'x': 'dead',
+    'K': 'wake-kill',
+    'W': 'waking',
+    'I': 'idle',
+    'P': 'parked'
+}
+
+
+class ScannedProcess(object):
+
+    """A process read by the ProcessScanner.
+
+    Compact record of the /proc/<pid>/stat, statm and status files. It
+    exposes the subset of the psutil.Process API used by the Processes
+    class, so the mandatory/standard/extended stats are unchanged. Stats
+    not available in the record are read through psutil (only for the
+    extended stats of the top process).
+    """
+
+    __slots__ = ('pid', 'parent_pid', 'pgrp', 'state', 'comm', 'niceness', 'threads',
+                 'starttime', 'cputimes', 'meminfo', 'uid_list', 'ctxsw',
+                 'swap', 'cpu_percent_value', 'memory_percent_value',
+                 '_scanner', '_process')
+
+    # Attributes served by the record (see the as_dict method)
+    local_attrs = frozenset(['pid', 'name', 'status', 'nice', 'num_threads',
+                             'cpu_times', 'memory_info', 'cpu_percent',
+                             'memory_percent', 'username', 'num_ctx_switches',
+                             'cmdline', 'io_counters', 'uids', 'ppid'])
+
+    def __init__(self, scanner, pid):
+        self._scanner = scanner
+        self._process = None
+        self.pid = pid
+
+    def __eq__(self, other):
+        return (isinstance(other, ScannedProcess) and
+                self.pid == other.pid and self.starttime == other.starttime)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.pid, self.starttime))
+
+    def __repr__(self):
+        return "ScannedProcess(pid={}, name='{}')".format(self.pid, self.comm)
+
+    def _psutil_process(self):
+        """Return the psutil.Process instance (created on demand)."""
+        if self._process is None:
+            self._process = psutil.Process(self.pid)
+        return self._process
+
+    def __getattr__(self, item):
+        """Fallback to psutil for the others methods (extended stats)."""
+        return getattr(self._psutil_process(), item)
+
+    def name(self):
+        return self._scanner.get_name(self)
+
+    def status(self):
+        return PROC_STATUSES.get(self.state, '?')
+
+    def ppid(self):
+        return self.parent_pid
+
+    def create_time(self):
+        return self._scanner.boot_time + self.starttime / float(self._scanner.clock_ticks)
+
+    def parent(self):
+        return self._scanner.get(self.parent_pid)
+
+    def nice(self):
+        return self.niceness
+
+    def num_threads(self):
+        return self.threads
+
+    def cpu_times(self):
+        return self.cputimes
+
+    def memory_info(self):
+        return self.meminfo
+
+    def cpu_percent(self):
+        return self.cpu_percent_value
+
+    def memory_percent(self):
+        return self.memory_percent_value
+
+    def num_ctx_switches(self):
+        return self.ctxsw
+
+    def uids(self):
+        return self.uid_list
+
+    def username(self):
+        return self._scanner.get_username(self.uid_list.real)
+
+    def cmdline(self):
+        return self._scanner.read_cmdline(self.pid)
+
+    def io_counters(self):
+        return self._scanner.read_io(self.pid)
+
+    def as_dict(self, attrs=None, ad_value=None):
+        """Return the given attributes as a dict (same as psutil)."""
+        ret = {}
+        remote = []
+        for attr in attrs:
+            if attr not in self.local_attrs:
+                remote.append(attr)
+                continue
+            try:
+                ret[attr] = self.pid if attr == 'pid' else getattr(self, attr)()
+            except psutil.AccessDenied:
+                ret[attr] = ad_value
+        if remote:
+            ret.update(self._psutil_process().as_dict(attrs=remote, ad_value=ad_value))
+        return ret
+
+
+class ProcessScanner(object):
+
+    """Read the processes stats directly from /proc.
+
+    Each cycle (scan method), the /proc/<pid>/stat, statm and status files
+    are read exactly once per process.
+    """
+
+    def __init__(self, procfs_path='/proc'):
+        self.procfs_path = procfs_path
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.total_phymem = psutil.virtual_memory().total
+        self.boot_time = psutil.boot_time()
+
+        # Processes of the current scan (key: pid)
+        self._processes = {}
+        # CPU time of the previous scan (key: (pid, starttime), value: (cputime, time))
+        self._cpu_old = {}
+        # Extended names (key: (pid, starttime))
+        self._names = {}
+        # User names (key: uid)
+        self._usernames = {}
+
+    @staticmethod
+    def is_available(procfs_path='/proc'):
+        """Return True if the scanner can be used on this system."""
+        return LINUX and os.path.exists(os.path.join(procfs_path, 'self', 'statm'))
+
+    def scan(self):
+        """Return the list of the running processes (ScannedProcess)."""
+        now = time()
+        processes = {}
+        for entry in os.listdir(self.procfs_path):
+            if not entry.isdigit():
+                continue
+            proc = self.read(int(entry), now)
+            if proc is not None:
+                processes[proc.pid] = proc
+
+        # Forget the dead processes
+        keys = set((p.pid, p.starttime) for p in processes.values())
+        for cache in (self._cpu_old, self._names):
+            for k in [k for k in cache if k not in keys]:
+                del cache[k]
+
+        self._processes = processes
+        return list(processes.values())
+
+    def get(self, pid):
+        """Return the process pid of the current scan (None if not found)."""
+        return self._processes.get(pid)
+
+    def __read_file(self, pid, name):
+        with open('{}/{}/{}'.format(self.procfs_path, pid, name), 'rb') as f:
+            return f.read()
+
+    def read(self, pid, now=None):
+        """Read and parse the stat, statm and status files of a process.
+
+        Return a ScannedProcess or None if the process is dead.
+        """
+        try:
+            stat = self.__read_file(pid, 'stat')
+            statm = self.__read_file(pid, 'statm')
+            status = self.__read_file(pid, 'status')
+        except (IOError, OSError):
+            # Process died during the scan
+            return None
+
+        proc = ScannedProcess(self, pid)
+
+        # /proc/<pid>/stat: pid (comm) state ppid pgrp ...
+        rpar = stat.rfind(b')')
+        proc.comm = nativestr(stat[stat.find(b'(') + 1:rpar])
+        fields = stat[rpar + 2:].split()
+        proc.state = nativestr(fields[0])
+        proc.parent_pid = int(fields[1])
+        proc.pgrp = int(fields[2])
+        proc.cputimes = pcputimes(*[int(i) / float(self.clock_ticks) for i in fields[11:15]])
+        proc.niceness = int(fields[16])
+        proc.threads = int(fields[17])
+        proc.starttime = int(fields[19])
+
+        # /proc/<pid>/statm: size resident shared text lib data dirty (in pages)
+        statm = [int(i) * self.page_size for i in statm.split()[:7]]
+        proc.meminfo = pmem(statm[1], statm[0], *statm[2:])
+
+        # /proc/<pid>/status
+        proc.uid_list = None
+        proc.swap = None
+        voluntary = involuntary = 0
+        for line in status.splitlines():
+            if line.startswith(b'Uid:'):
+                proc.uid_list = puids(*[int(i) for i in line.split()[1:4]])
+            elif line.startswith(b'VmSwap:'):
+                proc.swap = int(line.split()[1]) * 1024
+            elif line.startswith(b'voluntary_ctxt_switches:'):
+                voluntary = int(line.split()[1])
+            elif line.startswith(b'nonvoluntary_ctxt_switches:'):
+                involuntary = int(line.split()[1])
+        proc.ctxsw = pctxsw(voluntary, involuntary)
+
+        # CPU percent (same computation as psutil: percent of one CPU)
+        now = now or time()
+        key = (pid, proc.starttime)
+        cputime = proc.cputimes.user + proc.cputimes.system
+        try:
+            cputime_old, time_old = self._cpu_old[key]
+            proc.cpu_percent_value = round((cputime - cputime_old) / (now - time_old) * 100, 1)
+        except (KeyError, ZeroDivisionError):
+            proc.cpu_percent_value = 0.0
+        self._cpu_old[key] = (cputime, now)
+
+        # Memory percent
+        proc.memory_percent_value = proc.meminfo.rss / float(self.total_phymem) * 100
+
+        return proc
+
+    def get_name(self, proc):
+        """Return the process name (extended with the cmdline if truncated)."""
+        name = proc.comm
+        if len(name) < 15:
+            return name
+        key = (proc.pid, proc.starttime)
+        try:
+            return self._names[key]
+        except KeyError:
+            try:
+                cmdline = self.read_cmdline(proc.pid)
+            except psutil.Error:
+                cmdline = []
+            if cmdline:
+                extended_name = os.path.basename(cmdline[0])
+                if extended_name.startswith(name):
+                    name = extended_name
+                # Not cached if the cmdline is not yet available
+                self._names[key] = name
+            return name
+
+    def get_username(self, uid):
+        """Return the user name of uid."""
+        try:
+            return self._usernames[uid]
+        except KeyError:
+            try:
+                username = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                username = str(uid)
+            self._usernames[uid] = username
+            return username
+
+    def read_cmdline(self, pid):
+        """Return the command line of a process (list)."""
+        try:
+            data = nativestr(self.__read_file(pid, 'cmdline'))
+        except (IOError, OSError):
+            raise psutil.NoSuchProcess(pid)
+        if data.endswith('\x00'):
+            data = data[:-1]
+        if not data:
+            return []
+        return data.split('\x00')
+
+    def read_io(self, pid):
+        """Return the IO counters of a process."""
+        try:
+            data = self.__read_file(pid, 'io')
+        except (IOError, OSError) as e:
+            if getattr(e, 'errno', None) in (1, 13):
+                # EPERM or EACCES
+                raise psutil.AccessDenied(pid)
+            raise psutil.NoSuchProcess(pid)
+        fields = {}
+        for line in data.splitlines():
+            key, _, value = line.partition(b':')
+            fields[key] = int(value)
+        return pio(fields[b'syscr'], fields[b'syscw'],
+                   fields[b'read_bytes'], fields[b'write_bytes'])
@@ -24,6 +24,8 @@ class ProcessTreeNode(object):
         self.sort_key = sort_key
         self.sort_reverse = sort_reverse
         self.is_root = root
+        # Cached weight of the node and its children (see get_weight)
+        self.weight = None
 
     def __str__(self):
         """Return the tree as a string for debugging."""
@@ -62,31 +64,47 @@ class ProcessTreeNode(object):
                 current_node = nodes_to_flag_unsorted.pop()
                 current_node.children_sorted = False
                 current_node.sort_key = key
-                current_node.reverse_sorting = reverse
+                current_node.sort_reverse = reverse
+                current_node.weight = None
                 nodes_to_flag_unsorted.extend(current_node.children)
 
+    def get_own_weight(self):
+        """Return 'weight' of the process only (without its children)."""
+        if callable(self.sort_key):
+            return self.sort_key(self.stats)
+        elif self.sort_key == "io_counters":
+            stats = self.stats[self.sort_key]
+            return stats[0] - stats[2] + stats[1] - stats[3]
+        elif self.sort_key == "cpu_times":
+            return sum(self.stats[self.sort_key])
+        else:
+            return self.stats[self.sort_key]
+
     def get_weight(self):
-        """Return 'weight' of a process and all its children for sorting."""
+        """Return 'weight' of a process and all its children for sorting.
+
+        The weights of the subtree are computed once and cached (until the
+        sort key changes, see set_sorting).
+        """
         if self.sort_key == 'name' or self.sort_key == 'username':
             return self.stats[self.sort_key]
 
-        # sum ressource usage for self and children
-        total = 0
-        nodes_to_sum = collections.deque([self])
-        while nodes_to_sum:
-            current_node = nodes_to_sum.pop()
-            if isinstance(self.sort_key, collections.Callable):
-                total += self.sort_key(current_node.stats)
-            elif self.sort_key == "io_counters":
-                stats = current_node.stats[self.sort_key]
-                total += stats[0] - stats[2] + stats[1] - stats[3]
-            elif self.sort_key == "cpu_times":
-                total += sum(current_node.stats[self.sort_key])
-            else:
-                total += current_node.stats[self.sort_key]
-            nodes_to_sum.extend(current_node.children)
-
-        return total
+        if self.weight is None:
+            # List the nodes without cached weight, parents before children
+            nodes = []
+            nodes_to_visit = collections.deque([self])
+            while nodes_to_visit:
+                current_node = nodes_to_visit.pop()
+                if current_node.weight is not None:
+                    continue
+                nodes.append(current_node)
+                nodes_to_visit.extend(current_node.children)
+            # Sum ressource usage for self and children, children first
+            for current_node in reversed(nodes):
+                current_node.weight = (current_node.get_own_weight() +
+                                       sum(c.weight for c in current_node.children))
+
+        return self.weight
 
     def __len__(self):
         """Return the number of nodes in the tree."""
@@ -146,56 +164,37 @@ class ProcessTreeNode(object):
             nodes_to_search.extend(current_node.children)
 
     @staticmethod
-    def build_tree(process_dict, sort_key, sort_reverse, hide_kernel_threads, excluded_processes):
+    def build_tree(process_dict, sort_key, sort_reverse, hide_kernel_threads):
         """Build a process tree using using parent/child relationships.
 
+        The parent of a process is found through a pid index, using the
+        ppid collected during the processes scan (stats['ppid']).
+        Processes whose parent is not in process_dict (no parent, dead,
+        excluded or filtered parent) are added at the top level.
+
         Return the tree root node.
         """
         tree_root = ProcessTreeNode(root=True)
-        nodes_to_add_last = collections.deque()
 
-        # first pass: add nodes whose parent are in the tree
+        # pid index of the tree nodes
+        nodes = {}
         for process, stats in iteritems(process_dict):
-            new_node = ProcessTreeNode(process, stats, sort_key, sort_reverse)
-            try:
-                parent_process = process.parent()
-            except psutil.NoSuchProcess:
-                # parent is dead, consider no parent
-                parent_process = None
-            if (parent_process is None) or (parent_process in excluded_processes):
+            nodes[process.pid] = ProcessTreeNode(process, stats, sort_key, sort_reverse)
+
+        for pid, node in iteritems(nodes):
+            ppid = node.stats.get('ppid')
+            if ppid is None:
+                try:
+                    ppid = node.process.ppid()
+                except psutil.NoSuchProcess:
+                    # parent is dead, consider no parent
+                    ppid = None
+            parent_node = nodes.get(ppid)
+            if parent_node is None or parent_node is node:
                 # no parent, or excluded parent, add this node at the top level
-                tree_root.children.append(new_node)
-            else:
-                parent_node = tree_root.find_process(parent_process)
-                if parent_node is not None:
-                    # parent is already in the tree, add a new child
-                    parent_node.children.append(new_node)
-                else:
-                    # parent is not in tree, add this node later
-                    nodes_to_add_last.append(new_node)
-
-        # next pass(es): add nodes to their parents if it could not be done in
-        # previous pass
-        while nodes_to_add_last:
-            # pop from left and append to right to avoid infinite loop
-            node_to_add = nodes_to_add_last.popleft()
-            try:
-                parent_process = node_to_add.process.parent()
-            except psutil.NoSuchProcess:
-                # parent is dead, consider no parent, add this node at the top
-                # level
-                tree_root.children.append(node_to_add)
+                tree_root.children.append(node)
             else:
-                if (parent_process is None) or (parent_process in excluded_processes):
-                    # no parent, or excluded parent, add this node at the top level
-                    tree_root.children.append(node_to_add)
-                else:
-                    parent_node = tree_root.find_process(parent_process)
-                    if parent_node is not None:
-                        # parent is already in the tree, add a new child
-                        parent_node.children.append(node_to_add)
-                    else:
-                        # parent is not in tree, add this node later
-                        nodes_to_add_last.append(node_to_add)
+                # add a new child to the parent node
+                parent_node.children.append(node)
 
         return tree_root
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+
+"""Run the plugins update on a bounded pool of threads."""
+
+import threading
+from time import time
+
+from gl.compat import queue
+from gl.logger import logger
+
+
+class PluginScheduler(object):
+
+    """This class schedules the plugins update.
+
+    Independent plugins are updated in parallel by a bounded pool of
+    worker threads. A plugin is only started when all the plugins it
+    depends on (see GlancesPlugin.get_dependencies) are updated.
+
+    Each plugin has 'timeout' seconds to update its stats. If the deadline
+    is reached, the plugin keeps its previous stats and the cycle goes on
+    without it (and without the plugins depending on it). A plugin still
+    running from a previous cycle, or depending on such a plugin, is
+    skipped until it returns.
+    """
+
+    def __init__(self, plugins, max_workers=8, timeout=3):
+        """Init the scheduler.
+
+        plugins: dict of plugins (key: plugin name, value: plugin instance)
+        max_workers: size of the threads pool (0 for a sequential update)
+        timeout: maximum time (in seconds) allowed to a plugin update
+        """
+        self._plugins = plugins
+        self.max_workers = max(0, int(max_workers))
+        self.timeout = timeout
+
+        # Number of the current update cycle
+        self._cycle = 0
+        # Plugins currently updated by a worker
+        self._running = set()
+        # Start time of the plugins currently updated
+        self._started = {}
+
+        self._tasks = queue.Queue()
+        self._done = queue.Queue()
+        self._workers = []
+        for i in range(min(self.max_workers, len(self._plugins))):
+            worker = threading.Thread(target=self.__worker,
+                                      name='gl-update-{}'.format(i))
+            # Do not prevent Glances to exit if a plugin is hung
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+        logger.debug("Plugins update scheduler started with {} worker(s)".format(len(self._workers)))
+
+    def __worker(self):
+        """Worker loop: update the plugins given by the tasks queue."""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                # Stop the worker
+                break
+            cycle, name = task
+            self._started[name] = time()
+            try:
+                self._plugins[name].update()
+            except Exception as e:
+                logger.error("Cannot update the {} plugin ({})".format(name, e))
+            finally:
+                self._running.discard(name)
+                self._done.put((cycle, name))
+
+    def is_running(self, name):
+        """Return True if the plugin name is still updating."""
+        return name in self._running
+
+    def get_dependencies(self, name, names):
+        """Return the dependencies of the plugin name (restricted to names)."""
+        try:
+            deps = self._plugins[name].get_dependencies()
+        except AttributeError:
+            deps = []
+        return set(d for d in deps if d in names and d != name)
+
+    def update(self, names=None, on_submit=None):
+        """Update the given plugins (all the plugins if names is None).
+
+        on_submit: function called with the plugin name when its update
+        is started
+
+        Return when all the plugins are updated or have reached their
+        deadline. Return the list of the plugins submitted in this cycle.
+
+        A plugin is not submitted if one of its dependencies is still
+        running from a previous cycle, or reached its deadline in this
+        cycle (it could still update the shared state).
+        """
+        if names is None:
+            names = list(self._plugins)
+
+        if not self._workers:
+            # Sequential update (no thread)
+            names = self.__sorted(names)
+            for name in names:
+                if on_submit is not None:
+                    on_submit(name)
+                self._plugins[name].update()
+            return names
+
+        self._cycle += 1
+
+        # Skip the plugins still running from a previous cycle
+        for name in [n for n in names if n in self._running]:
+            logger.warning("The {} plugin is still updating, skip it".format(name))
+        # Running or expired plugins (their dependents are skipped)
+        blocking = set(self._running)
+        names = [n for n in names if n not in blocking]
+
+        # All the dependencies (to check the blocking ones) and the
+        # dependencies updated in this cycle (to wait for)
+        all_deps = dict((n, self.get_dependencies(n, self._plugins)) for n in names)
+        waiting = dict((n, all_deps[n] & set(names)) for n in names)
+        inflight = set()
+        done = set()
+        submitted = []
+        while waiting or inflight:
+            # Skip the plugins depending (even indirectly) on a blocking plugin
+            skipped = [n for n in waiting if all_deps[n] & blocking]
+            while skipped:
+                for name in skipped:
+                    logger.warning("The {} plugin depends on {}, skip it".format(
+                        name, ', '.join(sorted(all_deps[name] & blocking))))
+                    del waiting[name]
+                    blocking.add(name)
+                skipped = [n for n in waiting if all_deps[n] & blocking]
+
+            # Submit the plugins whose dependencies are satisfied
+            ready = [n for n, deps in waiting.items() if deps <= done]
+            if waiting and not ready and not inflight:
+                # Dependency loop, submit all the remaining plugins
+                logger.warning("Dependency loop between plugins {}".format(list(waiting)))
+                ready = list(waiting)
+            for name in ready:
+                del waiting[name]
+                self._started.pop(name, None)
+                self._running.add(name)
+                inflight.add(name)
+                submitted.append(name)
+                if on_submit is not None:
+                    on_submit(name)
+                self._tasks.put((self._cycle, name))
+
+            if not inflight:
+                continue
+            try:
+                cycle, name = self._done.get(timeout=self.__wait_time(inflight))
+            except queue.Empty:
+                # Give up the plugins that reached their deadline
+                # They are not done: their dependents are not submitted
+                for name in self.__expired(inflight):
+                    logger.warning("The {} plugin did not update in {} seconds".format(name, self.timeout))
+                    inflight.discard(name)
+                    blocking.add(name)
+            else:
+                if cycle == self._cycle:
+                    inflight.discard(name)
+                    done.add(name)
+
+        return submitted
+
+    def __sorted(self, names):
+        """Return the names list sorted to satisfy the dependencies."""
+        ret = []
+        waiting = dict((n, self.get_dependencies(n, names)) for n in names)
+        while waiting:
+            ready = [n for n, deps in waiting.items() if deps <= set(ret)] or list(waiting)
+            for name in ready:
+                del waiting[name]
+                ret.append(name)
+        return ret
+
+    def __wait_time(self, inflight):
+        """Return the time to wait for the next plugin to finish."""
+        started = [self._started[n] for n in inflight if n in self._started]
+        if not started:
+            # No plugin started yet (all the workers are busy)
+            return self.timeout
+        return max(0, min(started) + self.timeout - time())
+
+    def __expired(self, inflight):
+        """Return the plugins in inflight that reached their deadline."""
+        now = time()
+        inflight = list(inflight)
+        started = [self._started.get(n) for n in inflight]
+        if all(s is None for s in started):
+            # No worker available, give up all the plugins
+            return list(inflight)
+        return [n for n, s in zip(inflight, started)
+                if s is not None and now - s >= self.timeout]
+
+    def stop(self):
+        """Stop the workers."""
+        for _ in self._workers:
+            self._tasks.put(None)
+        self._workers = []
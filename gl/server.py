@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+
+"""Manage the JSON/HTTP API server mode.
+
+The server uses asyncio (Python 3.5 or higher only): this module is
+only imported in server mode.
+"""
+
+import asyncio
+import gzip
+import json
+import zlib
+from email.utils import formatdate
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from gl.logger import logger
+from gl.worker import Worker
+
+# API root path
+API_PATH = ('api', '2')
+
+HTTP_STATUS = {200: 'OK',
+               304: 'Not Modified',
+               400: 'Bad Request',
+               404: 'Not Found',
+               405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+class Response(object):
+
+    """A serialized JSON response (with its ETag and gzip body)."""
+
+    __slots__ = ('body', 'etag', '_gzip_body')
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = '"{:08x}-{:x}"'.format(zlib.crc32(body) & 0xffffffff, len(body))
+        self._gzip_body = None
+
+    @property
+    def gzip_body(self):
+        """Return the gzip body (compressed once)."""
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body)
+        return self._gzip_body
+
+
+class Server(Worker):
+
+    """This class runs the stats update loop and the HTTP API server.
+
+    API (JSON):
+    - /api/2/pluginslist: plugins list
+    - /api/2/all: all the stats
+    - /api/2/<plugin>: stats of a plugin
+    - /api/2/<plugin>/history[/<nb>]: history of a plugin
+    - /api/2/<plugin>/<item>: stats item of a plugin
+    - /api/2/<plugin>/<item>/history[/<nb>]: history of a stats item
+    - /api/2/<plugin>/<item>/<value>: stats of a plugin where item=value
+
+    Responses are serialized once per refresh (once per plugin refresh
+    for the plugins stats) and shared by all the clients. ETag,
+    If-None-Match and gzip are supported. With the since=<seq> parameter,
+    the request waits for the first stats snapshot after seq (long
+    polling). The sequence number of the snapshot is given by the
+    X-Stats-Seq header.
+    """
+
+    def __init__(self, config=None, args=None):
+        super(Server, self).__init__(config=config, args=args)
+        self.bind_address = args.bind_address
+        self.port = args.port
+        # Maximum wait of a long polling request (in seconds)
+        self.poll_timeout = max(30, 10 * self.refresh_time)
+
+        # Stats snapshot served and responses of its cycle (key: path)
+        self.snapshot = None
+        self.responses = {}
+        # Plugins stats responses (key: plugin, value: (stats, response))
+        self.plugin_responses = {}
+        # Set when a new snapshot is available
+        self.cycle = None
+
+    def run(self):
+        """Run the server (until CTRL-C)."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(self.__serve())
+        finally:
+            loop.close()
+            self.end()
+
+    async def __serve(self):
+        """Start the HTTP server and run the stats update loop."""
+        loop = asyncio.get_event_loop()
+        self.cycle = asyncio.Event()
+        self.new_cycle()
+        await asyncio.start_server(self.__handle, self.bind_address, self.port)
+        logger.info("Glances API server is running on http://{}:{}/{}".format(
+            self.bind_address, self.port, '/'.join(API_PATH)))
+        while True:
+            start = loop.time()
+            # Plugins update is blocking: run it in a thread
+            await loop.run_in_executor(None, self.stats.update)
+            self.new_cycle()
+            self.stats.export()
+            await asyncio.sleep(max(0, self.refresh_time - (loop.time() - start)))
+
+    def new_cycle(self):
+        """Serve the new stats snapshot and wake up the long polling requests."""
+        self.snapshot = self.stats.get_snapshot()
+        self.responses = {}
+        cycle, self.cycle = self.cycle, asyncio.Event()
+        cycle.set()
+
+    def get_plugin_response(self, plugin):
+        """Return the stats response of a plugin.
+
+        The response is serialized again only if the plugin stats changed
+        (the snapshot shares the stats of the plugins not refreshed).
+        """
+        stats = self.snapshot.get_raw(plugin)
+        try:
+            cached_stats, response = self.plugin_responses[plugin]
+        except KeyError:
+            pass
+        else:
+            if cached_stats is stats:
+                return response
+        response = self.build(self.snapshot.get_plugin(plugin).get_stats)
+        self.plugin_responses[plugin] = (stats, response)
+        return response
+
+    @staticmethod
+    def build(builder, *args):
+        """Return the Response of the JSON returned by builder (None if not found)."""
+        data = builder(*args)
+        if data is None:
+            return None
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return Response(data.encode('utf-8'))
+
+    def route(self, parts):
+        """Return the Response of the API path parts (None if not found)."""
+        if tuple(parts[:len(API_PATH)]) != API_PATH:
+            return None
+        parts = parts[len(API_PATH):]
+        if not parts:
+            return None
+        if parts == ['pluginslist']:
+            return self.build(self.snapshot.getAllPlugins)
+        if parts == ['all']:
+            return self.build(self.snapshot.getAllAsDict)
+
+        plugin = self.snapshot.get_plugin(parts[0])
+        if plugin is None:
+            return None
+        if len(parts) == 1:
+            return self.get_plugin_response(parts[0])
+        if parts[1] == 'history' and len(parts) <= 3:
+            # /<plugin>/history[/<nb>]
+            return self.build(plugin.get_stats_history, None, int(parts[2]) if len(parts) == 3 else 0)
+        if len(parts) == 2:
+            return self.build(plugin.get_stats_item, parts[1])
+        if parts[2] == 'history' and len(parts) <= 4:
+            # /<plugin>/<item>/history[/<nb>]
+            return self.build(plugin.get_stats_history, parts[1], int(parts[3]) if len(parts) == 4 else 0)
+        if len(parts) == 3:
+            return self.build(plugin.get_stats_value, parts[1], parts[2])
+        return None
+
+    async def get_response(self, method, target):
+        """Return the (status, Response) of a request."""
+        if method not in ('GET', 'HEAD'):
+            return 405, None
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            since = int(query['since'][0]) if 'since' in query else None
+        except ValueError:
+            return 400, None
+
+        if since is not None and self.snapshot.seq <= since:
+            # Long polling: wait for the next snapshot
+            try:
+                await asyncio.wait_for(self.cycle.wait(), self.poll_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        path = url.path
+        try:
+            response = self.responses[path]
+        except KeyError:
+            try:
+                response = self.route([unquote(p) for p in path.strip('/').split('/')])
+            except ValueError:
+                return 400, None
+            except Exception as e:
+                logger.error("Cannot serve {} ({})".format(path, e))
+                return 500, None
+            self.responses[path] = response
+        if response is None:
+            return 404, None
+        return 200, response
+
+    async def __handle(self, reader, writer):
+        """Serve the requests of a client connection (HTTP/1.1 keep-alive)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    self.write(writer, 400, None, {}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get('content-length', 0) or 0):
+                    await reader.readexactly(int(headers['content-length']))
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                status, response = await self.get_response(method, target)
+                self.write(writer, status, response, headers, keep_alive, head=method == 'HEAD')
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def write(self, writer, status, response, headers, keep_alive, head=False):
+        """Write the response of a request."""
+        response_headers = [('Date', formatdate(usegmt=True)),
+                            ('Connection', 'keep-alive' if keep_alive else 'close')]
+        body = b''
+        if response is not None:
+            response_headers += [('Content-Type', 'application/json; charset=utf-8'),
+                                 ('Cache-Control', 'no-cache'),
+                                 ('Vary', 'Accept-Encoding'),
+                                 ('ETag', response.etag),
+                                 ('X-Stats-Seq', str(self.snapshot.seq))]
+            if_none_match = headers.get('if-none-match')
+            if if_none_match is not None and \
+                    (if_none_match.strip() == '*' or
+                     response.etag in [t.strip() for t in if_none_match.split(',')]):
+                status = 304
+            elif 'gzip' in headers.get('accept-encoding', ''):
+                response_headers.append(('Content-Encoding', 'gzip'))
+                body = response.gzip_body
+            else:
+                body = response.body
+        elif status != 304:
+            body = json.dumps({'error': HTTP_STATUS[status]}).encode('utf-8')
+            response_headers.append(('Content-Type', 'application/json; charset=utf-8'))
+        response_headers.append(('Content-Length', str(len(body))))
+
+        data = ['HTTP/1.1 {} {}\r\n'.format(status, HTTP_STATUS[status])]
+        data += ['{}: {}\r\n'.format(k, v) for k, v in response_headers]
+        data.append('\r\n')
+        writer.write(''.join(data).encode('latin-1'))
+        if not head:
+            writer.write(body)
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+
+"""Frozen copy of the stats of a refresh cycle."""
+
+import threading
+from time import time
+
+from gl.compat import iteritems
+from gl.exports.export_schema import build_export
+from gl.logger import logger
+
+# Frozen plugins classes (key: plugin class)
+_frozen_classes = {}
+
+
+def freeze_stats(stats, memo=None):
+    """Return a copy of the stats for the snapshot.
+
+    Only the containers (dicts and lists) are copied: the values (numbers,
+    strings, tuples...) are never modified in place and are shared.
+    memo (key: id of a container, value: its copy) is shared by the copies
+    of a snapshot: export stats are often (a part of) the raw ones.
+    """
+    if not isinstance(stats, (dict, list)):
+        return stats
+    if memo is None:
+        memo = {}
+    try:
+        return memo[id(stats)]
+    except KeyError:
+        pass
+    if isinstance(stats, dict):
+        ret = memo[id(stats)] = stats.copy()
+        for k, v in iteritems(stats):
+            if isinstance(v, (dict, list)):
+                ret[k] = freeze_stats(v, memo)
+    else:
+        ret = memo[id(stats)] = [freeze_stats(v, memo) if isinstance(v, (dict, list)) else v
+                                 for v in stats]
+    return ret
+
+
+def frozen_plugin_class(cls):
+    """Return the frozen class of the plugin class cls.
+
+    A frozen plugin has its own stats and views (the snapshot ones). All
+    the others attributes are read from the plugin. A frozen plugin is
+    read-only, except the display_attributes of the plugin class (state
+    of the display, written to the plugin).
+    """
+    try:
+        return _frozen_classes[cls]
+    except KeyError:
+        pass
+
+    def __getattribute__(self, name):
+        d = object.__getattribute__(self, '__dict__')
+        if name in d:
+            return d[name]
+        plugin_dict = d['_plugin'].__dict__
+        if name in plugin_dict:
+            return plugin_dict[name]
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if name not in cls.display_attributes:
+            raise AttributeError("Cannot set {} of the frozen {} plugin".format(
+                name, object.__getattribute__(self, '_plugin').plugin_name))
+        setattr(object.__getattribute__(self, '_plugin'), name, value)
+
+    frozen_cls = type('Frozen' + cls.__name__, (cls,),
+                      {'__getattribute__': __getattribute__,
+                       '__setattr__': __setattr__,
+                       '__module__': cls.__module__})
+    _frozen_classes[cls] = frozen_cls
+    return frozen_cls
+
+
+class StatsSnapshot(object):
+
+    """This class is a frozen copy of the stats of a refresh cycle.
+
+    It is taken by Stats.update and shared by the screen, the export modules
+    and the history: they all see the same stats, even if the plugins are
+    updated meanwhile. Stats of the snapshot should not be modified.
+
+    Plugins not updated during the cycle (refresh time not reached or still
+    running) share the copy of the previous snapshot.
+    """
+
+    def __init__(self, stats, seq=0, previous=None, updated=None, running=()):
+        """Take the snapshot.
+
+        stats: Stats instance
+        seq: sequence number of the snapshot
+        previous: previous snapshot
+        updated: plugins updated since the previous snapshot (None for all)
+        running: plugins still running their update
+        """
+        self.seq = seq
+        self.timestamp = time()
+        self._plugins = stats.getAllPlugins()
+        # Frozen data (key: plugin name, value: dict)
+        self._data = {}
+        for p in self._plugins:
+            if previous is not None and p in previous._data and \
+                    (p in running or (updated is not None and p not in updated)):
+                self._data[p] = previous._data[p]
+                continue
+            try:
+                self._data[p] = self.__freeze(stats.get_plugin(p))
+            except Exception as e:
+                logger.debug("Cannot take a snapshot of the {} plugin ({})".format(p, e))
+                if previous is not None and p in previous._data:
+                    self._data[p] = previous._data[p]
+                else:
+                    self._data[p] = {'plugin': stats.get_plugin(p), 'raw': None,
+                                     'export': None, 'limits': {}, 'views': {}}
+        # Export columns (key: plugin) and frozen plugins (key: plugin)
+        self._export_data = {}
+        self._frozen_plugins = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def __freeze(plugin):
+        """Return the frozen data of a plugin."""
+        # Shared memo: export stats are often (a part of) the raw ones
+        memo = {}
+        # Views are not copied: a new views dict is built by each update
+        return {'plugin': plugin,
+                'raw': plugin.get_stats_snapshot(plugin.get_raw(), memo),
+                'export': plugin.get_stats_snapshot(plugin.get_export(), memo),
+                'limits': dict(plugin.limits),
+                'views': plugin.get_views()}
+
+    def getAllPlugins(self):
+        """Return the plugins list."""
+        return list(self._plugins)
+
+    def get_plugin(self, plugin_name):
+        """Return the frozen plugin (with the snapshot stats and views)."""
+        if plugin_name not in self._data:
+            return None
+        with self._lock:
+            try:
+                return self._frozen_plugins[plugin_name]
+            except KeyError:
+                data = self._data[plugin_name]
+                plugin = data['plugin']
+                frozen = object.__new__(frozen_plugin_class(plugin.__class__))
+                object.__setattr__(frozen, '_plugin', plugin)
+                object.__setattr__(frozen, 'stats', data['raw'])
+                object.__setattr__(frozen, 'views', data['views'])
+                self._frozen_plugins[plugin_name] = frozen
+                return frozen
+
+    def get_raw(self, plugin_name):
+        """Return the stats of a plugin."""
+        return self._data[plugin_name]['raw']
+
+    def getAll(self):
+        """Return all the stats (list)."""
+        return [self._data[p]['raw'] for p in self._plugins]
+
+    def getAllAsDict(self):
+        """Return all the stats (dict)."""
+        return dict((p, self._data[p]['raw']) for p in self._plugins)
+
+    def getAllExports(self):
+        """Return all the stats to be exported (list)."""
+        return [self._data[p]['export'] for p in self._plugins]
+
+    def getAllLimits(self):
+        """Return the plugins limits list."""
+        return [self._data[p]['limits'] for p in self._plugins]
+
+    def getAllLimitsAsDict(self):
+        """Return all the stats limits (dict)."""
+        return dict((p, self._data[p]['limits']) for p in self._plugins)
+
+    def getAllViews(self):
+        """Return the plugins views."""
+        return [self._data[p]['views'] for p in self._plugins]
+
+    def getAllViewsAsDict(self):
+        """Return all the stats views (dict)."""
+        return dict((p, self._data[p]['views']) for p in self._plugins)
+
+    def get_export_data(self, plugin_name):
+        """Return the (names, values) lists to export for a plugin.
+
+        Columns are built once per snapshot and shared by all the export
+        modules. Return None if the plugin has no stats to export.
+        """
+        with self._lock:
+            try:
+                data = self._export_data[plugin_name]
+            except KeyError:
+                stats = self._data[plugin_name]['export']
+                if isinstance(stats, (dict, list)):
+                    data = build_export(plugin_name, stats, self._data[plugin_name]['limits'])
+                else:
+                    data = None
+                self._export_data[plugin_name] = data
+        if data is None:
+            return None
+        # Export modules can update the lists
+        return list(data[0]), list(data[1])
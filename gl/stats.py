@@ -6,10 +6,13 @@
 import collections
 import os
 import sys
-import threading
 
+from gl.exports.export_worker import ExportWorker
 from gl.globals import exports_path, plugins_path, sys_path
+from gl.history import new_history_tick
 from gl.logger import logger
+from gl.scheduler import PluginScheduler
+from gl.snapshot import StatsSnapshot
 
 
 class Stats(object):
@@ -30,6 +33,17 @@ class Stats(object):
         # Load the limits (for plugins)
         self.load_limits(config)
 
+        # Init the plugins update scheduler
+        self.load_scheduler(config)
+
+        # Init the export workers
+        self.load_export_workers(config)
+
+        # Stats snapshot of the last update (see StatsSnapshot)
+        self.snapshot = None
+        # Plugins still updating when the last snapshot was taken
+        self._snapshot_running = set()
+
     def __getattr__(self, item):
         """Overwrite the getattr method in case of attribute is not found.
 
@@ -137,28 +151,108 @@ class Stats(object):
         for p in self._plugins:
             self._plugins[p].load_limits(config)
 
+    def load_scheduler(self, config=None):
+        """Init the plugins update scheduler.
+
+        The pool size (update_workers) and the per-plugin deadline
+        (update_timeout) are read from the global section of the
+        configuration file. Default deadline is the refresh time.
+        """
+        max_workers = 8
+        timeout = getattr(self.args, 'time', 3)
+        if hasattr(config, 'has_section') and config.has_section('global'):
+            max_workers = config.get_float_value('global', 'update_workers', default=max_workers)
+            timeout = config.get_float_value('global', 'update_timeout', default=timeout)
+        self.scheduler = PluginScheduler(self._plugins,
+                                         max_workers=max_workers,
+                                         timeout=timeout)
+
+    def load_export_workers(self, config=None):
+        """Init one worker thread per export module.
+
+        The size of the workers queue and the policy used when the queue is
+        full (drop or coalesce) are set in the [global] section.
+        """
+        queue_size = 2
+        policy = 'drop'
+        if config is not None and config.has_section('global'):
+            queue_size = int(config.get_float_value('global', 'export_queue_size', default=queue_size))
+            policy = config.get_value('global', 'export_queue_policy', default=policy)
+        self._export_workers = {}
+        for e in self._exports:
+            self._export_workers[e] = ExportWorker(self._exports[e],
+                                                   queue_size=queue_size,
+                                                   policy=policy)
+
     def update(self):
         """Wrapper method to update the stats."""
         # For standalone and server modes
-        # For each plugins, call the update method
+        # Only update the plugins whose refresh time is reached,
+        # others keep their cached stats
+        # Plugins are updated in parallel (see the PluginScheduler class)
+        # One history tick per update
+        new_history_tick()
+        # The refresh timer is restarted when the update is submitted: a
+        # plugin skipped by the scheduler (still running) is updated in
+        # the next cycle
+        updated = self.scheduler.update([p for p in self._plugins
+                                         if self._plugins[p].is_refresh_needed()],
+                                        on_submit=lambda p: self._plugins[p].reset_refresh_timer())
+        self.take_snapshot(updated)
+
+    def take_snapshot(self, updated=None):
+        """Take the stats snapshot of the cycle and update the history.
+
+        updated: plugins updated during the cycle (None for all)
+        The screen, the export modules and the history use this snapshot.
+        """
+        running = set(p for p in self._plugins if self.scheduler.is_running(p))
+        if updated is not None:
+            # Add the plugins updated after the previous snapshot
+            updated = set(updated) | (self._snapshot_running - running)
+        previous = self.snapshot
+        self.snapshot = StatsSnapshot(self,
+                                      seq=previous.seq + 1 if previous is not None else 0,
+                                      previous=previous,
+                                      updated=updated,
+                                      running=running)
+        self._snapshot_running = running
+
+        # Update the history with the new stats
         for p in self._plugins:
-            # logger.debug("Update %s stats" % p)
-            self._plugins[p].update()
+            if p in running or (updated is not None and p not in updated):
+                continue
+            plugin = self._plugins[p]
+            try:
+                plugin.update_stats_history(plugin.get_key() or '',
+                                            stats=self.snapshot.get_raw(p))
+            except Exception as e:
+                logger.error("Cannot update the {} plugin history ({})".format(p, e))
+        return self.snapshot
+
+    def get_snapshot(self):
+        """Return the stats snapshot of the last update."""
+        if self.snapshot is None:
+            return self.take_snapshot()
+        return self.snapshot
 
     def export(self, input_stats=None):
         """Export all the stats.
 
-        Each export module is ran in a dedicated thread.
+        Each export module is ran in a dedicated thread (see ExportWorker),
+        fed with the stats snapshot of the last update (or input_stats).
         """
-        # threads = []
-        input_stats = input_stats or {}
+        if not self._export_workers:
+            return
+        snapshot = input_stats if isinstance(input_stats, StatsSnapshot) else self.get_snapshot()
 
-        for e in self._exports:
-            logger.debug("Export stats using the %s module" % e)
-            thread = threading.Thread(target=self._exports[e].update,
-                                      args=(input_stats,))
-            # threads.append(thread)
-            thread.start()
+        for e in self._export_workers:
+            logger.debug("Export stats using the {} module (queue depth: {})".format(e, self._export_workers[e].depth))
+            self._export_workers[e].put(snapshot)
+
+    def getExportsMetrics(self):
+        """Return the export workers metrics (dict)."""
+        return dict((e, w.get_metrics()) for e, w in self._export_workers.items())
 
     def getAll(self):
         """Return all the stats (list)."""
@@ -215,8 +309,17 @@ class Stats(object):
 
     def end(self):
         """End of the Glances stats."""
-        # Close export modules
+        # Stop the update workers
+        self.scheduler.stop()
+        # Stop the export workers
+        timeout = self.args.time if self.args is not None else None
+        running = [e for e in self._export_workers if not self._export_workers[e].stop(timeout=timeout)]
+        # Close export modules (not the ones still used by their worker,
+        # the worker thread is a daemon thread)
         for e in self._exports:
+            if e in running:
+                logger.warning("Export module {} not closed (still exporting)".format(e))
+                continue
             self._exports[e].exit()
         # Close plugins
         for p in self._plugins:
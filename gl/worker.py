@@ -40,6 +40,13 @@ class Worker(object):
             # Ignore kernel threads in process list
             gl_processes.disable_kernel_threads()
 
+        try:
+            if args.enable_process_scanner:
+                # Read processes stats directly from /proc
+                gl_processes.enable_scanner()
+        except AttributeError:
+            pass
+
         try:
             if args.process_tree:
                 # Enable process tree view
@@ -76,13 +83,13 @@ class Worker(object):
 
             if not self.quiet:
                 # Update the screen
-                self.screen.update(self.stats)
+                self.screen.update(self.stats.get_snapshot())
             else:
                 # Wait...
                 sleep(self.refresh_time)
 
             # Export stats using export modules
-            self.stats.export(self.stats)
+            self.stats.export()
 
     def run(self):
         """Wrapper to the serve_forever function.
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Export modules unitary tests (against local stand-in servers).
+
+Run: python unitest_exports.py
+"""
+
+import os
+import re
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+from gl.compat import queue
+from gl.config import Config
+from gl.exports import glances_opentsdb
+
+try:
+    from gl.exports import glances_statsd
+except ImportError:
+    glances_statsd = None
+
+try:
+    import bernhard
+    from gl.exports import glances_riemann
+except ImportError:
+    glances_riemann = None
+
+
+class FakeStats(object):
+
+    """Stats of a refresh (same interface as the stats snapshot)."""
+
+    def __init__(self, nb_interfaces=20):
+        self.timestamp = time.time()
+        self.plugins = ['cpu', 'load', 'network']
+        self.exports = [{'user': 1.5, 'system': 2.25, 'idle': 96.25, 'cpucore': 4},
+                        {'min1': 0.5, 'min5': 0.25, 'min15': 0.125, 'cpucore': 4},
+                        [{'key': 'interface_name', 'interface_name': 'eth{}'.format(i),
+                          'rx': 1000 + i, 'tx': 2000 + i, 'cumulative_rx': 10000 + i}
+                         for i in range(nb_interfaces)]]
+
+    def getAllPlugins(self):
+        return self.plugins
+
+    def getAllExports(self):
+        return self.exports
+
+    def getAllLimits(self):
+        return [{} for _ in self.plugins]
+
+
+def make_config(section, **options):
+    """Return a Config read from a temporary configuration file."""
+    tmpdir = tempfile.mkdtemp(prefix='gl-unitest-')
+    path = os.path.join(tmpdir, 'glances.conf')
+    with open(path, 'w') as f:
+        f.write('[{}]\n'.format(section))
+        for k, v in options.items():
+            f.write('{}={}\n'.format(k, v))
+    try:
+        return Config(path)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def read_exactly(conn, size):
+    """Read size bytes (less if the connection is closed)."""
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class StandInServer(threading.Thread):
+
+    """Local TCP server.
+
+    Connections are accepted one after the other and read by the handle
+    function, which puts the received items in the received queue (as
+    (connection number, item) tuples). The first connection is closed
+    after close_after items (never if None).
+    """
+
+    def __init__(self, handle, close_after=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.handle = handle
+        self.close_after = close_after
+        self.received = queue.Queue()
+        self.connections = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(5)
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.stopped = False
+        self.start()
+
+    def run(self):
+        while not self.stopped:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            conn.settimeout(5)
+            limit = self.close_after if self.connections == 1 else None
+            try:
+                self.handle(self, conn, limit)
+            except (IOError, OSError):
+                pass
+            finally:
+                conn.close()
+
+    def put(self, item):
+        self.received.put((self.connections, item))
+
+    def get(self, nb):
+        """Return the next nb received items."""
+        return [self.received.get(timeout=5) for _ in range(nb)]
+
+    def stop(self):
+        self.stopped = True
+        self.join()
+        self.sock.close()
+
+
+@unittest.skipIf(glances_statsd is None, 'StatsD library not installed')
+class TestStatsd(unittest.TestCase):
+
+    """StatsD export against a local UDP socket."""
+
+    mtu = 512
+
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(0.5)
+        config = make_config('statsd', host='127.0.0.1', port=self.server.getsockname()[1],
+                             prefix='glances', mtu=self.mtu)
+        self.export = glances_statsd.Export(config=config, args=None)
+
+    def tearDown(self):
+        self.export.exit()
+        if hasattr(self.export.client, 'close'):
+            self.export.client.close()
+        self.server.close()
+
+    def receive(self):
+        """Return the datagrams received (until no more datagram)."""
+        datagrams = []
+        while True:
+            try:
+                datagrams.append(self.server.recv(65536))
+            except socket.timeout:
+                return datagrams
+
+    def test_cycle(self):
+        """Stats of a cycle are sent in a few datagrams of at most mtu bytes."""
+        stats = FakeStats()
+        expected = set()
+        for plugin, item in zip(stats.plugins[:2], stats.exports[:2]):
+            expected |= set('glances.{}.{}'.format(plugin, k) for k in item)
+        for item in stats.exports[2]:
+            expected |= set('glances.network.{}.{}'.format(item['interface_name'], k)
+                            for k in ('rx', 'tx', 'cumulative_rx'))
+
+        for cycle in range(3):
+            self.assertTrue(self.export.update(stats))
+            datagrams = self.receive()
+            lines = [l for d in datagrams for l in d.decode('utf-8').split('\n')]
+            # All the numeric stats, one gauge per stat
+            self.assertEqual(set(l.split(':')[0] for l in lines), expected)
+            self.assertEqual(len(lines), len(expected))
+            self.assertTrue(all(l.endswith('|g') for l in lines))
+            # Pipelined: datagrams are filled up to the MTU (lines are < 50 bytes)
+            self.assertLessEqual(len(datagrams), len(''.join(lines)) // (self.mtu - 28 - 50) + 1)
+            self.assertTrue(all(len(d) <= self.mtu - 28 for d in datagrams))
+
+    def test_no_stats(self):
+        """No datagram if there is no stat to export."""
+        stats = FakeStats()
+        stats.plugins = []
+        stats.exports = []
+        self.export.update(stats)
+        self.assertEqual(self.receive(), [])
+
+
+class TestOpenTSDB(unittest.TestCase):
+
+    """OpenTSDB export against a local TCP server."""
+
+    re_line = re.compile(r'^put (glances\.[\w.]+) (\d+) ([\d.]+) env=test host=\S+$')
+
+    def setUp(self):
+        self.stats = FakeStats()
+        # cpu (4), load (4) and network (3 per interface) stats
+        self.nb_lines = 8 + 3 * len(self.stats.exports[2])
+
+    def start(self, close_after=None):
+        self.server = StandInServer(self.handle, close_after=close_after)
+        config = make_config('opentsdb', host='127.0.0.1', port=self.server.port,
+                             prefix='glances', tags='env:test')
+        self.export = glances_opentsdb.Export(config=config, args=None)
+
+    def tearDown(self):
+        self.export.exit()
+        self.server.stop()
+
+    @staticmethod
+    def handle(server, conn, limit):
+        """Read the 'put' lines."""
+        nb = 0
+        for line in conn.makefile('rb'):
+            server.put(line.decode('utf-8'))
+            nb += 1
+            if nb == limit:
+                return
+
+    def test_lines(self):
+        """All the stats of a cycle are sent as 'put' lines."""
+        self.start()
+        self.export.update(self.stats)
+        lines = [line for _, line in self.server.get(self.nb_lines)]
+        matches = [self.re_line.match(line.rstrip('\n')) for line in lines]
+        self.assertTrue(all(matches), lines)
+        names = set(m.group(1) for m in matches)
+        self.assertIn('glances.cpu.user', names)
+        self.assertIn('glances.network.eth0.rx', names)
+        self.assertEqual(len(names), self.nb_lines)
+        self.assertEqual(set(m.group(2) for m in matches), set([str(int(self.stats.timestamp))]))
+        self.assertTrue(self.server.received.empty())
+
+    def test_reconnect(self):
+        """A failed send reconnects at the next cycle."""
+        self.start(close_after=self.nb_lines)
+        self.export.update(self.stats)
+        self.assertEqual(set(n for n, _ in self.server.get(self.nb_lines)), set([1]))
+        # The server closed the connection: the next sends fail (the first
+        # one can be accepted by the system), then the export reconnects
+        for _ in range(5):
+            time.sleep(0.1)
+            self.export.update(self.stats)
+            if self.server.connections == 2:
+                break
+        received = self.server.get(self.nb_lines)
+        self.assertEqual(set(n for n, _ in received), set([2]))
+        self.assertTrue(all(self.re_line.match(line.rstrip('\n')) for _, line in received))
+
+
+@unittest.skipIf(glances_riemann is None, 'Bernhard library not installed')
+class TestRiemann(unittest.TestCase):
+
+    """Riemann export against a local TCP server."""
+
+    def setUp(self):
+        self.stats = FakeStats()
+        self.nb_events = 8 + 3 * len(self.stats.exports[2])
+
+    def start(self, close_after=None):
+        self.server = StandInServer(self.handle, close_after=close_after)
+        config = make_config('riemann', host='127.0.0.1', port=self.server.port)
+        self.export = glances_riemann.Export(config=config, args=None)
+
+    def tearDown(self):
+        self.export.exit()
+        if self.export.client.connection is not None:
+            self.export.client.disconnect()
+        self.server.stop()
+
+    @staticmethod
+    def handle(server, conn, limit):
+        """Read the messages (4 bytes length + protobuf message) and reply ok."""
+        nb = 0
+        while True:
+            header = read_exactly(conn, 4)
+            if len(header) < 4:
+                return
+            message = bernhard.Message(raw=read_exactly(conn, struct.unpack('!I', header)[0]))
+            server.put(message.events)
+            response = bernhard.Message()
+            response.ok = True
+            conn.sendall(struct.pack('!I', len(response.raw)) + response.raw)
+            nb += 1
+            if nb == limit:
+                return
+
+    def test_message(self):
+        """All the events of a cycle are sent in a single message."""
+        self.start()
+        self.export.update(self.stats)
+        (_, events), = self.server.get(1)
+        self.assertEqual(len(events), self.nb_events)
+        services = dict((e.service, e.metric) for e in events)
+        self.assertEqual(services['cpu user'], 1.5)
+        self.assertEqual(services['network eth0.rx'], 1000)
+        self.assertEqual(set(e.time for e in events), set([int(self.stats.timestamp)]))
+
+    def test_reconnect(self):
+        """A failed send reconnects."""
+        self.start(close_after=1)
+        self.export.update(self.stats)
+        self.export.update(self.stats)
+        received = self.server.get(2)
+        self.assertEqual([n for n, _ in received], [1, 2])
+        self.assertEqual(len(received[1][1]), self.nb_events)
+
+
+if __name__ == '__main__':
+    unittest.main()